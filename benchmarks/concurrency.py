@@ -0,0 +1,113 @@
+# benchmarks/concurrency.py
+"""Concurrency benchmark for the patient and appointment read endpoints.
+
+Fires concurrent requests at the app in-process and reports throughput and latency.
+On SQLite every statement is delayed by --latency-ms to stand in for the network
+round-trip to Postgres: a handler that blocks the event loop on that delay serializes
+every in-flight request, one that awaits it does not.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.concurrency
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, time as time_of_day, timedelta
+
+import httpx
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import Base, engine
+from src.main import app
+from src.models import Appointment, Dentist, Patient, User
+from src.security import create_access_token
+from src.utils import hash_password
+
+
+def add_statement_latency(latency: float):
+    def _sleep(_statement):
+        time.sleep(latency)
+
+    def _on_connect(dbapi_connection, _connection_record):
+        if hasattr(dbapi_connection, "run_async"):
+            dbapi_connection.run_async(lambda conn: conn.set_trace_callback(_sleep))
+        else:
+            dbapi_connection.set_trace_callback(_sleep)
+
+    event.listen(getattr(engine, "sync_engine", engine), "connect", _on_connect)
+
+
+def seed(appointments: int):
+    sync_engine = create_engine(settings.database_url)
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    with Session(sync_engine) as db:
+        db.add(User(username="bench", hashed_password=hash_password("benchpassword")))
+        patient = Patient(first_name="Bench", last_name="Patient", email="bench@example.com")
+        dentist = Dentist(first_name="Bench", last_name="Dentist")
+        db.add_all([patient, dentist])
+        db.flush()
+        db.add_all([
+            Appointment(patient_id=patient.id, dentist_id=dentist.id, date=date(2024, 1, 1) + timedelta(days=day),
+                        time=time_of_day(9, 0), treatment_type="cleaning")
+            for day in range(appointments)
+        ])
+        db.commit()
+        patient_id = patient.id
+    sync_engine.dispose()
+    return patient_id
+
+
+async def run(path: str, headers: dict, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def report(paths, headers: dict, requests: int, concurrency: int):
+    for path in paths:
+        result = await run(path, headers, requests, concurrency)
+        print(f"{path:<50} {result['rps']:>8.1f} req/s  p50 {result['p50']:>7.1f} ms  p95 {result['p95']:>7.1f} ms")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--appointments", type=int, default=20)
+    args = parser.parse_args()
+
+    if settings.database_url.startswith("sqlite"):
+        add_statement_latency(args.latency_ms / 1000)
+    patient_id = seed(args.appointments)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'bench'})}"}
+
+    paths = (f"/patient/patients/{patient_id}", f"/appointment/dental/patients/{patient_id}/appointments")
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    asyncio.run(report(paths, headers, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
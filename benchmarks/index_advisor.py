@@ -0,0 +1,173 @@
+# benchmarks/index_advisor.py
+"""Index advisor for the read routes.
+
+Seeds a database, replays each list and lookup route in-process while recording the SQL it
+runs, then asks the database for the plan of every recorded statement and flags sequential
+scans of tables holding at least --min-rows rows. Exits non-zero when anything is flagged.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.index_advisor
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date, datetime, time as time_of_day, timedelta
+
+import httpx
+from sqlalchemy import create_engine, event, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.database import Base, engine
+from src.explain import explain_sql, seq_scans
+from src.main import app
+from src.models import Appointment, Availability, Billing, Dentist, Feedback, Notification, Patient, User
+from src.security import create_access_token
+from src.utils import hash_password
+
+START = date(2024, 1, 1)
+TREATMENTS = ("cleaning", "filling", "extraction", "root_canal")
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+# Unfiltered keyset pages walk the table in primary key order and stop after one page, which
+# SQLite reports as a plain scan.
+BOUNDED_SCANS = {"/feedback/": {"feedbacks"}}
+
+
+def seed(patients: int, dentists: int, appointments_per_patient: int):
+    sync_engine = create_engine(settings.database_url)
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    with Session(sync_engine) as db:
+        user = User(username="advisor", hashed_password=hash_password("advisorpassword"))
+        db.add(user)
+        db.flush()
+        db.execute(insert(Dentist), [{"first_name": "Dentist", "last_name": str(i), "speciality": "general",
+                                      "license_number": f"LIC-{i}"}
+                                     for i in range(dentists)])
+        db.execute(insert(Patient), [
+            {"first_name": "Patient", "last_name": str(i), "email": f"patient{i}@example.com"} for i in range(patients)
+        ])
+        db.execute(insert(Availability), [
+            {"dentist_id": dentist_id, "day_of_week": (START + timedelta(days=day)).strftime("%A"),
+             "start_time": datetime.combine(START + timedelta(days=day), time_of_day(8)),
+             "end_time": datetime.combine(START + timedelta(days=day), time_of_day(18))}
+            for dentist_id in range(1, dentists + 1) for day in range(90)
+        ])
+        # Every appointment takes its own (dentist, day, hour) so the double-booking index is satisfied.
+        appointments = [
+            {"patient_id": i % patients + 1, "dentist_id": i % dentists + 1,
+             "date": START + timedelta(days=i // (dentists * 8)), "time": time_of_day(9 + i // dentists % 8),
+             "treatment_type": TREATMENTS[i % len(TREATMENTS)]}
+            for i in range(patients * appointments_per_patient)
+        ]
+        db.execute(insert(Appointment), appointments)
+        db.execute(insert(Billing), [
+            {"appointment_id": i + 1, "patient_id": row["patient_id"], "amount_due": 100.0, "payment_status": "paid",
+             "payment_method": "card", "insurance_claim_id": f"CLAIM-{i}"}
+            for i, row in enumerate(appointments)
+        ])
+        db.execute(insert(Feedback), [
+            {"appointment_id": i + 1, "patient_id": row["patient_id"], "dentist_id": row["dentist_id"], "rating": 5,
+             "comments": "Great"}
+            for i, row in enumerate(appointments) if i % 4 == 0
+        ])
+        db.execute(insert(Notification), [{"user_id": user.id, "message": f"Reminder {i}"} for i in range(patients)])
+        db.commit()
+        user_id = user.id
+    with sync_engine.begin() as conn:
+        # Fresh statistics, so the planner costs the seeded tables as it would in production.
+        conn.execute(text("ANALYZE"))
+    sync_engine.dispose()
+    return user_id
+
+
+def routes(patient_id: int, dentist_id: int, appointment_id: int):
+    day = datetime.combine(START + timedelta(days=7), time_of_day.min)
+    window = f"from={day.isoformat()}&to={(day + timedelta(days=1)).isoformat()}"
+    return [
+        f"/patient/patients/{patient_id}",
+        f"/appointment/dental/patients/{patient_id}/appointments",
+        f"/appointment/dental/appointments/{appointment_id}",
+        f"/appointment/dental/appointments?dentist_id={dentist_id}&{window}",
+        f"/appointment/dental/appointments/export?dentist_id={dentist_id}",
+        f"/billing/patient/{patient_id}",
+        f"/billing/export?dentist_id={dentist_id}",
+        f"/availability/{dentist_id}",
+        f"/availability/{dentist_id}/slots?{window}",
+        f"/availability/first-available?treatment_type=cleaning&from={day.isoformat()}",
+        f"/availability/rules/{dentist_id}",
+        f"/dentist/dentists/{dentist_id}",
+        "/feedback/",
+    ]
+
+
+async def replay(paths, headers: dict) -> dict:
+    """Request each path and return ``{path: [(sql, params)]}`` for the statements it ran."""
+    recorded = {}
+    current = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINABLE):
+            current.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://advisor") as client:
+            for path in paths:
+                current.clear()
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+                recorded[path] = list({sql: (sql, params) for sql, params in current}.values())
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _record)
+    return recorded
+
+
+async def advise(recorded: dict, min_rows: int, verbose: bool) -> int:
+    tables = set(Base.metadata.tables)
+    flagged = 0
+    async with engine.connect() as conn:
+        sizes = {}
+        for path, statements in recorded.items():
+            print(path)
+            for sql, params in statements:
+                plan = await conn.run_sync(explain_sql, sql, params)
+                for table in dict.fromkeys(seq_scans(plan, conn.dialect.name)):
+                    if table not in tables or table in BOUNDED_SCANS.get(path, ()):
+                        continue
+                    if table not in sizes:
+                        sizes[table] = (await conn.execute(select(func.count()).select_from(text(table)))).scalar()
+                    if sizes[table] >= min_rows:
+                        flagged += 1
+                        print(f"  SEQ SCAN {table} ({sizes[table]} rows): {' '.join(sql.split())[:200]}")
+                if verbose:
+                    print("    " + plan.replace("\n", "\n    "))
+    return flagged
+
+
+async def run(paths, headers: dict, min_rows: int, verbose: bool) -> int:
+    try:
+        return await advise(await replay(paths, headers), min_rows, verbose)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--dentists", type=int, default=50)
+    parser.add_argument("--appointments-per-patient", type=int, default=5)
+    parser.add_argument("--min-rows", type=int, default=1000, help="only flag scans of tables at least this big")
+    parser.add_argument("--verbose", action="store_true", help="print every plan, not just the flagged scans")
+    args = parser.parse_args()
+
+    user_id = seed(args.patients, args.dentists, args.appointments_per_patient)
+    token = create_access_token(data={"sub": "advisor", "uid": user_id, "role": "admin", "active": True})
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = routes(args.patients // 2, args.dentists // 2, args.patients)
+    flagged = asyncio.run(run(paths, headers, args.min_rows, args.verbose))
+    print(f"{flagged} sequential scan(s) over {args.min_rows} rows")
+    sys.exit(1 if flagged else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/serialization.py
+"""Serialization benchmark for a 1,000-appointment list response.
+
+Requests one patient's appointments as a single page, in-process, first through the default
+``response_model`` path and then with ``FAST_JSON_RESPONSES`` on, checks both return the same
+JSON, and reports throughput for each.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.serialization
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.concurrency import seed
+from src.config import settings
+from src.database import engine
+from src.main import app
+from src.security import create_access_token
+from src.serialization import orjson
+
+
+async def run(path: str, headers: dict, requests: int):
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for _ in range(requests):
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+    return response.json(), latencies
+
+
+async def report(path: str, headers: dict, requests: int):
+    bodies = {}
+    for fast in (False, True):
+        settings.fast_json_responses = fast
+        bodies[fast], latencies = await run(path, headers, requests)
+        name = "fast path" + (" (orjson)" if orjson else " (json)") if fast else "response_model"
+        print(f"{name:<20} {len(latencies) / sum(latencies):>8.1f} req/s  "
+              f"p50 {statistics.median(latencies) * 1000:>7.2f} ms  {len(bodies[fast])} appointments")
+    assert bodies[False] == bodies[True], "the fast path changed the response"
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--appointments", type=int, default=1000)
+    args = parser.parse_args()
+
+    patient_id = seed(args.appointments)
+    token = create_access_token(data={"sub": "bench", "uid": 1, "role": "admin", "active": True})
+    headers = {"Authorization": f"Bearer {token}"}
+    path = f"/appointment/dental/patients/{patient_id}/appointments?limit={args.appointments}"
+    print(f"{args.requests} sequential requests for {args.appointments} appointments")
+    asyncio.run(report(path, headers, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/startup.py
+"""Startup benchmark for the schema check a worker runs on boot.
+
+Compares ``Base.metadata.create_all``, which reflects every table, with ``src.migrations.migrate``
+against a current schema, which reads one version row. Each boot starts from a disposed pool so
+it pays for a fresh connection, as a new worker would. On SQLite every statement is delayed by
+--latency-ms to stand in for the round-trip to Postgres.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.startup
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import event
+
+from benchmarks.concurrency import add_statement_latency
+from src.config import settings
+from src.database import Base, engine
+from src.migrations import migrate, upgrade
+
+
+def create_all(connection):
+    Base.metadata.create_all(connection)
+    connection.commit()
+
+
+async def boot(check) -> float:
+    await engine.dispose()
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        await conn.run_sync(check)
+    return (time.perf_counter() - started) * 1000
+
+
+async def report(boots: int):
+    counted = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: counted.append(1))
+    async with engine.connect() as conn:
+        await conn.run_sync(upgrade)
+    for name, check in (("create_all", create_all), ("migrate (current)", migrate)):
+        counted.clear()
+        latencies = [await boot(check) for _ in range(boots)]
+        print(f"{name:<20} mean {statistics.mean(latencies):>8.2f} ms  p50 {statistics.median(latencies):>8.2f} ms  "
+              f"{len(counted) / boots:>5.1f} statements per boot")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boots", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if settings.database_url.startswith("sqlite"):
+        add_statement_latency(args.latency_ms / 1000)
+    print(f"{args.boots} boots per strategy")
+    asyncio.run(report(args.boots))
+
+
+if __name__ == "__main__":
+    main()
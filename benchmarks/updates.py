@@ -0,0 +1,95 @@
+# benchmarks/updates.py
+"""Latency benchmark for the PUT routes.
+
+Sends sequential updates to each route in-process and reports per-request latency. On
+SQLite every statement is delayed by --latency-ms to stand in for the round-trip to
+Postgres, so the numbers track how many statements each update costs.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.updates
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, time as time_of_day
+
+import httpx
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.concurrency import add_statement_latency
+from src.config import settings
+from src.database import Base, engine
+from src.main import app
+from src.models import Appointment, Billing, Dentist, Patient, Report
+
+
+def seed():
+    sync_engine = create_engine(settings.database_url)
+    Base.metadata.drop_all(bind=sync_engine)
+    Base.metadata.create_all(bind=sync_engine)
+    with Session(sync_engine) as db:
+        patient = Patient(first_name="Bench", last_name="Patient", email="bench@example.com")
+        dentist = Dentist(first_name="Bench", last_name="Dentist")
+        db.add_all([patient, dentist])
+        db.flush()
+        appointment = Appointment(patient_id=patient.id, dentist_id=dentist.id, date=date(2024, 1, 1),
+                                  time=time_of_day(9, 0), treatment_type="cleaning")
+        db.add(appointment)
+        db.flush()
+        billing = Billing(appointment_id=appointment.id, patient_id=patient.id, amount_due=100.0,
+                          payment_status="pending")
+        report = Report(patient_id=patient.id, dentist_id=dentist.id, appointment_id=appointment.id,
+                        report_details="x" * 4096)
+        db.add_all([billing, report])
+        db.commit()
+        ids = {"patient": patient.id, "dentist": dentist.id, "appointment": appointment.id,
+               "billing": billing.id, "report": report.id}
+    sync_engine.dispose()
+    return ids
+
+
+def payloads(ids: dict, i: int):
+    # Vary each body so the ORM can't skip an unchanged UPDATE.
+    return {
+        f"/patient/patients/{ids['patient']}": {"first_name": "Bench", "last_name": f"Updated {i}",
+                                                "email": "bench@example.com"},
+        f"/dentist/dentists/{ids['dentist']}": {"first_name": "Bench", "last_name": f"Updated {i}"},
+        f"/billing/{ids['billing']}": {"appointment_id": ids["appointment"], "patient_id": ids["patient"],
+                                       "amount_due": 100.0 + i, "payment_status": "paid", "payment_method": "card",
+                                       "insurance_claim_id": "CLAIM-1"},
+        f"/reports/reports/{ids['report']}": {"patient_id": ids["patient"], "dentist_id": ids["dentist"],
+                                              "appointment_id": ids["appointment"],
+                                              "report_details": f"{i} " + "y" * 4096},
+    }
+
+
+async def report(ids: dict, requests: int):
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for path in payloads(ids, 0):
+            latencies = []
+            for i in range(requests):
+                started = time.perf_counter()
+                response = await client.put(path, json=payloads(ids, i)[path])
+                latencies.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+            print(f"PUT {path:<40} mean {statistics.mean(latencies):>7.2f} ms  "
+                  f"p50 {statistics.median(latencies):>7.2f} ms")
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if settings.database_url.startswith("sqlite"):
+        add_statement_latency(args.latency_ms / 1000)
+    ids = seed()
+    print(f"{args.requests} sequential requests per route")
+    asyncio.run(report(ids, args.requests))
+
+
+if __name__ == "__main__":
+    main()
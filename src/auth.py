@@ -1,40 +1,55 @@
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.cache import LRUCache
 from src.config import settings
+from src.constants import UserRole
 from src.database import get_db
+from src.hashing import hashing_executor
 from src.models import User
+from src.revocation import revocation_filter
 from src.schemas import UserCreate
 from src.security import ALGORITHM
 from src.utils import hash_password, verify_password
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# (user, issued_at) keyed on the raw bearer token, so repeat requests skip the JWT decode.
+principal_cache = LRUCache(settings.principal_cache_size, settings.principal_cache_ttl)
+
+
+def invalidate_principal(user_id: int):
+    principal_cache.delete_where(lambda cached: cached[0].id == user_id)
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
 
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = hash_password(user.password)
+
+async def create_user(db: AsyncSession, user: UserCreate):
+    hashed_password = await hashing_executor.run(hash_password, user.password)
     db_user = User(username=user.username, hashed_password=hashed_password, role=user.role)  # Update this line
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-async def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    if not verify_password(password, user.hashed_password):
+    if not await hashing_executor.run(verify_password, password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -43,21 +58,37 @@ async def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        user = db.query(User).filter(User.username == username).first()
-        if user is None:
+    cached = principal_cache.get(token)
+    if cached is None:
+        try:
+            payload = jwt.decode(token, settings.jwt_secret, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+            if "uid" in payload:
+                user = User(id=payload["uid"], username=username, role=UserRole(payload["role"]),
+                            is_active=payload["active"])
+            else:
+                # Tokens minted before claims were embedded only carry the username.
+                user = await get_user(db, username)
+                if user is None:
+                    raise credentials_exception
+        except JWTError:
             raise credentials_exception
-        return user
-    except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        cached = (user, payload.get("iat", 0))
+        expires_at = None
+        if payload.get("exp") is not None:
+            expires_at = time.monotonic() + payload["exp"] - time.time()
+        principal_cache.set(token, cached, expires_at=expires_at)
+    user, issued_at = cached
+    if not user.is_active or await revocation_filter.is_revoked(db, user.id, issued_at):
+        principal_cache.delete(token)
+        raise credentials_exception
+    return user
\ No newline at end of file
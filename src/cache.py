@@ -0,0 +1,66 @@
+# src/cache.py
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded least-recently-used cache whose entries also expire after ``ttl`` seconds.
+
+    ``on_evict``, if given, is called with the key of each entry dropped for space or found expired.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+                if self.on_evict:
+                    self.on_evict(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, expires_at: float = None):
+        deadline = time.monotonic() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        self._entries[key] = (deadline, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            evicted, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(evicted)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def delete_where(self, predicate):
+        for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
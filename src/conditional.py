@@ -0,0 +1,105 @@
+# src/conditional.py
+"""Conditional requests driven by each row's ``updated_at``.
+
+A row's version is its ``updated_at``, sent as a weak ``ETag`` and as ``Last-Modified``. A GET
+carrying ``If-None-Match`` or ``If-Modified-Since`` first reads only that column and answers 304
+when the client's copy is current; unconditional GETs cost no extra query. A PUT carrying
+``If-Match`` updates the row only while it still has one of the listed versions, otherwise 412.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.crud import update_by_id
+from src.exceptions import PreconditionFailedError
+
+ETAG_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def make_etag(updated_at: datetime) -> str:
+    return f'W/"{updated_at.strftime(ETAG_FORMAT)}"'
+
+
+def parse_etag(etag: str) -> Optional[datetime]:
+    """The ``updated_at`` an ETag from ``make_etag`` stands for, or None for any other tag."""
+    etag = etag.strip().removeprefix("W/").strip('"')
+    try:
+        return datetime.strptime(etag, ETAG_FORMAT)
+    except ValueError:
+        return None
+
+
+def version_headers(updated_at: Optional[datetime]) -> dict:
+    if updated_at is None:
+        return {}
+    # updated_at is naive UTC.
+    return {"ETag": make_etag(updated_at),
+            "Last-Modified": format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)}
+
+
+def set_version_headers(response: Response, updated_at: Optional[datetime]):
+    response.headers.update(version_headers(updated_at))
+
+
+def is_fresh(request: Request, updated_at: datetime) -> bool:
+    """Whether the client's cached copy, as described by its validators, is still ``updated_at``."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since; ETags compare weakly.
+        return if_none_match.strip() == "*" or any(
+            parse_etag(tag) == updated_at for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # HTTP dates have whole seconds.
+    return updated_at.replace(microsecond=0) <= since
+
+
+async def not_modified(db: AsyncSession, model, row_id: int, request: Request) -> Optional[Response]:
+    """A 304 response when the request is conditional and row ``row_id`` hasn't changed, else None.
+
+    Reads only ``updated_at``, and only when the request carries a validator. None also covers a
+    missing row, which the caller's full read then reports.
+    """
+    if "if-none-match" not in request.headers and "if-modified-since" not in request.headers:
+        return None
+    updated_at = (await db.execute(select(model.updated_at).filter(model.id == row_id))).scalar()
+    if updated_at is None or not is_fresh(request, updated_at):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=version_headers(updated_at))
+
+
+def if_match_criteria(request: Request, model) -> list:
+    """Extra UPDATE criteria that enforce the request's ``If-Match`` header on ``model``."""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return []
+    versions = [version for version in map(parse_etag, if_match.split(",")) if version is not None]
+    return [model.updated_at.in_(versions)]
+
+
+async def update_if_match(db: AsyncSession, model, row_id: int, values: dict, request: Request,
+                          response: Response) -> Optional[dict]:
+    """``update_by_id`` honouring ``If-Match``; sets the new version headers on ``response``.
+
+    Raises PreconditionFailedError when the row exists but has changed since the client read it;
+    returns None when there is no row ``row_id``.
+    """
+    criteria = if_match_criteria(request, model)
+    row = await update_by_id(db, model, row_id, values, criteria=criteria)
+    if row is None and criteria:
+        if (await db.execute(select(model.id).filter(model.id == row_id))).scalar() is not None:
+            raise PreconditionFailedError()
+    if row is not None:
+        set_version_headers(response, row["updated_at"])
+    return row
@@ -1,5 +1,6 @@
 # src/config.py
 from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 from pydantic.v1 import BaseSettings
@@ -11,6 +12,33 @@ class Settings(BaseSettings):
     database_url: str
     jwt_secret: str
     debug: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    read_database_url: Optional[str] = None
+    replica_max_lag_seconds: float = 5
+    replica_lag_check_seconds: float = 5
+    read_your_writes_seconds: float = 10
+    hash_pool_size: int = 4
+    hash_queue_limit: int = 64
+    principal_cache_size: int = 1024
+    principal_cache_ttl: int = 60
+    access_token_expire_minutes: int = 30
+    revocation_refresh_seconds: int = 30
+    default_page_size: int = 100
+    max_page_size: int = 1000
+    calendar_index_size: int = 20000
+    calendar_index_ttl: int = 300
+    max_slots_range_days: int = 90
+    migrate_on_startup: bool = True
+    cache_url: Optional[str] = None
+    response_cache_size: int = 10000
+    dentist_cache_ttl: int = 300
+    availability_cache_ttl: int = 60
+    fast_json_responses: bool = False
+    import_error_limit: int = 100
 
     class Config:
         env_file = ".env"
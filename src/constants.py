@@ -24,3 +24,13 @@ class InsuranceProvider(Enum):
     provider_a = "Provider A"
     provider_b = "Provider B"
     provider_c = "Provider C"
+
+
+# Minutes each treatment keeps the dentist's chair busy.
+TREATMENT_DURATIONS = {
+    TreatmentType.cleaning.value: 30,
+    TreatmentType.filling.value: 45,
+    TreatmentType.extraction.value: 60,
+    TreatmentType.root_canal.value: 90,
+}
+DEFAULT_TREATMENT_DURATION = 30
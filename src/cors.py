@@ -8,4 +8,5 @@ def add_cors_middleware(app):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
     )
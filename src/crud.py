@@ -0,0 +1,58 @@
+# src/crud.py
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Keeps each bulk DELETE well under the driver's bind-parameter limit.
+BULK_CHUNK_SIZE = 1000
+
+
+async def update_by_id(db: AsyncSession, model, row_id: int, values: dict, commit: bool = True, criteria=()):
+    """Apply ``values`` to one row with a single UPDATE ... RETURNING.
+
+    Returns the updated row as a dict, or None when no row has ``row_id`` or the row fails the
+    extra WHERE ``criteria``. Pass ``commit=False`` to add more statements to the same transaction
+    before committing.
+    """
+    stmt = update(model).where(model.id == row_id, *criteria).values(**values).returning(*model.__table__.columns)
+    row = (await db.execute(stmt)).mappings().first()
+    if commit:
+        await db.commit()
+    return dict(row) if row is not None else None
+
+
+async def delete_by_id(db: AsyncSession, model, row_id: int, commit: bool = True, returning=None):
+    """Delete one row with a single DELETE ... RETURNING id.
+
+    Returns the deleted id, or None when no row has ``row_id``. Pass a non-null column of ``model``
+    as ``returning`` to get the deleted row's value of it instead, e.g. the owner to invalidate.
+    """
+    stmt = delete(model).where(model.id == row_id).returning(model.id if returning is None else returning)
+    deleted_id = (await db.execute(stmt)).scalar()
+    if commit:
+        await db.commit()
+    return deleted_id
+
+
+async def delete_by_ids(db: AsyncSession, model, row_ids: list, commit: bool = True, returning=None):
+    """Delete many rows in one transaction, one DELETE ... RETURNING id per chunk of ids.
+
+    Returns ``(deleted, not_found)`` id lists. With a ``returning`` column, also returns the set of
+    its values across the deleted rows, as a third item.
+    """
+    unique_ids = list(dict.fromkeys(row_ids))
+    deleted = []
+    values = set()
+    columns = [model.id] if returning is None else [model.id, returning]
+    for start in range(0, len(unique_ids), BULK_CHUNK_SIZE):
+        chunk = unique_ids[start:start + BULK_CHUNK_SIZE]
+        stmt = delete(model).where(model.id.in_(chunk)).returning(*columns)
+        for row in (await db.execute(stmt)).all():
+            deleted.append(row[0])
+            values.update(row[1:])
+    if commit:
+        await db.commit()
+    deleted_set = set(deleted)
+    not_found = [row_id for row_id in unique_ids if row_id not in deleted_set]
+    if returning is None:
+        return sorted(deleted_set), not_found
+    return sorted(deleted_set), not_found, values
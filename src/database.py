@@ -1,18 +1,188 @@
 # src/database.py
-from sqlalchemy import create_engine
+import bisect
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from src.cache import LRUCache
 from src.config import settings
 
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+# Zero when the replica has replayed everything it received, so an idle primary doesn't read as lag.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def make_async_url(database_url: str) -> str:
+    """Swap a plain database URL's driver for its asyncio counterpart."""
+    scheme, sep, rest = database_url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+class PoolMetrics:
+    """Checkout latency histogram and connection lifecycle counters for one engine's pool."""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bucket_counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.checkout_count = 0
+        self.checkout_total_ms = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.engine = None
+
+    def observe_checkout(self, elapsed_ms: float):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.BUCKETS_MS, elapsed_ms)] += 1
+            self.checkout_count += 1
+            self.checkout_total_ms += elapsed_ms
+
+    def listen(self, engine):
+        # Listening on the engine rather than its pool survives engine.dispose() recreating the pool.
+        self.engine = engine
+        event.listen(engine, "connect", lambda *args: self.increment("connects"))
+        event.listen(engine, "checkin", lambda *args: self.increment("checkins"))
+        event.listen(engine, "invalidate", lambda *args: self.increment("invalidations"))
+
+    def increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        with self._lock:
+            labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["le_inf"]
+            return {
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkout_count,
+                "avg_checkout_ms": self.checkout_total_ms / self.checkout_count if self.checkout_count else 0.0,
+                "checkout_histogram": dict(zip(labels, self.bucket_counts)),
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+            }
+
+
+pool_metrics = PoolMetrics()
+replica_pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that times each checkout, including the wait for a free connection."""
+
+    # A class attribute, since the engine builds (and on dispose rebuilds) the pool from its class alone.
+    metrics = pool_metrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.increment("timeouts")
+            raise
+        self.metrics.observe_checkout((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class ReplicaPool(InstrumentedPool):
+    metrics = replica_pool_metrics
+
+
+engine = create_async_engine(
+    make_async_url(settings.database_url),
+    poolclass=InstrumentedPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+pool_metrics.listen(engine.sync_engine)
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+read_engine = engine
+if settings.read_database_url:
+    read_engine = create_async_engine(
+        make_async_url(settings.read_database_url),
+        poolclass=ReplicaPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    replica_pool_metrics.listen(read_engine.sync_engine)
+ReadSessionLocal = async_sessionmaker(bind=read_engine, class_=AsyncSession, autoflush=False,
+                                      expire_on_commit=False)
+
+# Clients that wrote within the last READ_YOUR_WRITES_SECONDS keep reading from the primary.
+recent_writers = LRUCache(10000, settings.read_your_writes_seconds)
+
+
+class ReplicaLagMonitor:
+    """Caches whether the read replica is within ``max_lag`` seconds of the primary."""
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = None
+        self.fresh = True
+        self._checked_at = None
+
+    async def replica_is_fresh(self) -> bool:
+        if read_engine.dialect.name != "postgresql":
+            return True
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self.fresh
+        self._checked_at = time.monotonic()
+        try:
+            async with read_engine.connect() as conn:
+                self.lag = (await conn.execute(REPLICA_LAG_SQL)).scalar()
+            self.fresh = self.lag is None or self.lag <= self.max_lag
+        except (OSError, SQLAlchemyError):
+            self.fresh = False
+        return self.fresh
+
+
+replica_monitor = ReplicaLagMonitor(settings.replica_max_lag_seconds, settings.replica_lag_check_seconds)
+
+
+def client_key(request: Request) -> str:
+    return request.headers.get("authorization") or (request.client.host if request.client else "")
+
+
+async def get_db(request: Request):
+    if request.method != "GET":
+        recent_writers.set(client_key(request), True)
+    async with SessionLocal() as db:
+        yield db
+
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_read_db(request: Request):
+    session_factory = ReadSessionLocal
+    if read_engine is engine or recent_writers.get(client_key(request)) or not await replica_monitor.replica_is_fresh():
+        session_factory = SessionLocal
+    async with session_factory() as db:
         yield db
-    finally:
-        db.close()
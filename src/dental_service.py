@@ -1,20 +1,197 @@
-from sqlalchemy.orm import Session
+from datetime import date, datetime, time
 
-from src.models import Appointment, Patient
+from fastapi import HTTPException, Response, status
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.crud import update_by_id
+from src.exceptions import ConflictError, NotFoundError, PreconditionFailedError
+from src.models import Appointment, Dentist, Patient
+from src.pagination import PageParams, paginate
+from src.scheduling import appointment_interval, load_bookings, overlapping, overlaps, publish_calendar_change
 from src.schemas import AppointmentCreate
 
+# First key of pg_advisory_xact_lock(int, int) for booking locks; the second is the dentist ID.
+BOOKING_LOCK_NAMESPACE = 4201
+DOUBLE_BOOKED = "Dentist already booked at this time"
+SLOT_INDEX = next(index for index in Appointment.__table__.indexes if index.name == "uq_appointments_dentist_slot")
+
+
+def parse_slot(appointment: AppointmentCreate):
+    return date.fromisoformat(appointment.date), time.fromisoformat(appointment.time)
+
+
+async def lock_dentists(db: AsyncSession, dentist_ids):
+    """Serialize bookings for ``dentist_ids`` until the transaction ends.
+
+    Takes PostgreSQL transaction-level advisory locks, so bookings for other dentists never wait.
+    SQLite has no row or advisory locks, so there a no-op UPDATE takes the database write lock,
+    which serializes every booking. Elsewhere this is a no-op and the unique slot index is the only
+    guard.
+    """
+    if db.bind.dialect.name == "sqlite" and dentist_ids:
+        await db.execute(text("UPDATE dentists SET id = id WHERE id = :id"), {"id": min(dentist_ids)})
+    if db.bind.dialect.name != "postgresql":
+        return
+    # A fixed order keeps two batches locking overlapping dentists from deadlocking.
+    for dentist_id in sorted(dentist_ids):
+        await db.execute(select(func.pg_advisory_xact_lock(BOOKING_LOCK_NAMESPACE, dentist_id)))
+
 
-def create_appointment(db: Session, appointment: AppointmentCreate):
-    db_appointment = Appointment(**appointment.dict())
-    db.add(db_appointment)
-    db.commit()
-    db.refresh(db_appointment)
+def is_slot_conflict(error: IntegrityError) -> bool:
+    """Whether ``error`` violates the one-booking-per-slot index, as opposed to e.g. a foreign key."""
+    message = str(error.orig)
+    # PostgreSQL names the index; SQLite lists its columns.
+    columns = ", ".join(f"{column.table.name}.{column.name}" for column in SLOT_INDEX.columns)
+    return SLOT_INDEX.name in message or f"UNIQUE constraint failed: {columns}" in message
+
+
+async def check_participants(db: AsyncSession, appointment: AppointmentCreate):
+    """Raise NotFoundError unless the appointment's patient and dentist exist."""
+    if not await patient_exists(db, appointment.patient_id):
+        raise NotFoundError(detail="Patient not found")
+    dentist = await db.execute(select(Dentist.id).filter(Dentist.id == appointment.dentist_id))
+    if dentist.scalar() is None:
+        raise NotFoundError(detail="Dentist not found")
+
+
+async def save_appointment(db: AsyncSession, appointment: AppointmentCreate, appointment_id: int = None,
+                           criteria=()):
+    """Insert ``appointment``, or update row ``appointment_id``, unless it overlaps the dentist's other bookings.
+
+    Raises NotFoundError when the patient or dentist doesn't exist, ConflictError when the dentist
+    is already booked, and PreconditionFailedError when the row exists but fails the extra update
+    ``criteria``; returns the row, or None when there is no row ``appointment_id``.
+    """
+    try:
+        slot_date, slot_time = parse_slot(appointment)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    interval = appointment_interval(slot_date, slot_time, appointment.treatment_type)
+    values = {**appointment.dict(), "date": slot_date, "time": slot_time, "starts_at": interval[0],
+              "ends_at": interval[1]}
+    changed_dentists = {appointment.dentist_id}
+    if appointment_id is not None:
+        previous = await db.execute(select(Appointment.dentist_id).filter(Appointment.id == appointment_id))
+        previous_dentist = previous.scalar()
+        if previous_dentist is None:
+            return None
+        changed_dentists.add(previous_dentist)
+    await check_participants(db, appointment)
+
+    await lock_dentists(db, [appointment.dentist_id])
+    bookings = await load_bookings(db, [appointment.dentist_id], *interval, exclude_id=appointment_id)
+    if overlaps(interval, bookings[appointment.dentist_id]):
+        await db.rollback()
+        raise ConflictError(detail=DOUBLE_BOOKED)
+    try:
+        if appointment_id is None:
+            db_appointment = Appointment(**values)
+            db.add(db_appointment)
+            await db.flush()
+        else:
+            db_appointment = await update_by_id(db, Appointment, appointment_id, values, commit=False,
+                                                criteria=criteria)
+            if db_appointment is None and criteria:
+                await db.rollback()
+                raise PreconditionFailedError()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if not is_slot_conflict(e):
+            raise
+        # A concurrent booking for the exact same slot won the race to the unique index.
+        raise ConflictError(detail=DOUBLE_BOOKED)
+    if db_appointment:
+        await publish_calendar_change(db, changed_dentists)
     return db_appointment
 
 
-def get_patient_by_id(db: Session, patient_id: int):
-    return db.query(Patient).filter(Patient.id == patient_id).first()
+async def create_appointment(db: AsyncSession, appointment: AppointmentCreate):
+    return await save_appointment(db, appointment)
+
+
+def appointments_in_range_query(dentist_id: int, start: datetime, end: datetime):
+    stmt = select(Appointment).filter(Appointment.dentist_id == dentist_id)
+    return overlapping(stmt, start, end).order_by(Appointment.starts_at)
+
+
+async def get_appointments_in_range(db: AsyncSession, dentist_id: int, start: datetime, end: datetime, options=()):
+    result = await db.execute(appointments_in_range_query(dentist_id, start, end).options(*options))
+    return result.scalars().all()
+
+
+async def get_patient_by_id(db: AsyncSession, patient_id: int):
+    result = await db.execute(select(Patient).filter(Patient.id == patient_id))
+    return result.scalars().first()
+
+
+async def patient_exists(db: AsyncSession, patient_id: int) -> bool:
+    result = await db.execute(select(Patient.id).filter(Patient.id == patient_id))
+    return result.scalar() is not None
+
+
+async def get_appointments_by_patient_id(db: AsyncSession, patient_id: int, page: PageParams, response: Response,
+                                         options=()):
+    stmt = select(Appointment).filter(Appointment.patient_id == patient_id).options(*options)
+    return await paginate(db, stmt, Appointment, page, response)
+
+
+async def create_appointments_batch(db: AsyncSession, payloads: list):
+    """Book many appointments in one transaction.
+
+    Every payload is validated up front, referenced patients and dentists are checked with one
+    ``IN`` query each, and the accepted rows go in as a single multi-row INSERT. An appointment is a
+    conflict when it overlaps one of the dentist's bookings, either in the database or earlier in
+    the same batch. Returns one result dict per payload, in order.
+    """
+    results = [None] * len(payloads)
+    candidates = []
+    for index, payload in enumerate(payloads):
+        try:
+            appointment = AppointmentCreate(**payload)
+            slot_date, slot_time = parse_slot(appointment)
+        except (TypeError, ValueError, ValidationError) as e:
+            results[index] = {"index": index, "status": "invalid", "detail": str(e)}
+            continue
+        interval = appointment_interval(slot_date, slot_time, appointment.treatment_type)
+        candidates.append((index, appointment, slot_date, slot_time, interval))
+
+    patient_ids = {appointment.patient_id for _, appointment, *_ in candidates}
+    dentist_ids = {appointment.dentist_id for _, appointment, *_ in candidates}
+    known_patients, known_dentists, booked = set(), set(), {}
+    if candidates:
+        await lock_dentists(db, dentist_ids)
+        known_patients = set((await db.execute(select(Patient.id).filter(Patient.id.in_(patient_ids)))).scalars())
+        known_dentists = set((await db.execute(select(Dentist.id).filter(Dentist.id.in_(dentist_ids)))).scalars())
+        booked = await load_bookings(db, dentist_ids, min(interval[0] for *_, interval in candidates),
+                                     max(interval[1] for *_, interval in candidates))
 
+    rows, row_indexes = [], []
+    for index, appointment, slot_date, slot_time, interval in candidates:
+        if appointment.patient_id not in known_patients:
+            results[index] = {"index": index, "status": "invalid", "detail": "Patient not found"}
+        elif appointment.dentist_id not in known_dentists:
+            results[index] = {"index": index, "status": "invalid", "detail": "Dentist not found"}
+        elif overlaps(interval, booked[appointment.dentist_id]):
+            results[index] = {"index": index, "status": "conflict", "detail": DOUBLE_BOOKED}
+        else:
+            booked[appointment.dentist_id].append(interval)
+            rows.append({**appointment.dict(), "date": slot_date, "time": slot_time, "starts_at": interval[0],
+                         "ends_at": interval[1]})
+            row_indexes.append(index)
 
-def get_appointments_by_patient_id(db: Session, patient_id: int):
-    return db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
\ No newline at end of file
+    if rows:
+        try:
+            created_ids = (await db.execute(insert(Appointment).returning(Appointment.id, sort_by_parameter_order=True),
+                                            rows)).scalars().all()
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise ConflictError(detail="A concurrent booking took one of these slots; retry the batch")
+        await publish_calendar_change(db, {row["dentist_id"] for row in rows})
+        for index, appointment_id in zip(row_indexes, created_ids):
+            results[index] = {"index": index, "status": "created", "appointment_id": appointment_id}
+    return results
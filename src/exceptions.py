@@ -2,6 +2,11 @@
 from fastapi import HTTPException, status
 
 
+class BadRequestError(HTTPException):
+    def __init__(self, detail: str = "Bad request", headers=None):
+        super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail, headers=headers)
+
+
 class AuthenticationError(HTTPException):
     def __init__(self, detail: str = "Authentication required", headers=None):
         super().__init__(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers=headers)
@@ -15,3 +20,18 @@ class AuthorizationError(HTTPException):
 class NotFoundError(HTTPException):
     def __init__(self, detail: str = "Resource not found", headers=None):
         super().__init__(status_code=status.HTTP_404_NOT_FOUND, detail=detail, headers=headers)
+
+
+class ConflictError(HTTPException):
+    def __init__(self, detail: str = "Conflict", headers=None):
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail, headers=headers)
+
+
+class PreconditionFailedError(HTTPException):
+    def __init__(self, detail: str = "Resource has changed", headers=None):
+        super().__init__(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=detail, headers=headers)
+
+
+class TooManyRequestsError(HTTPException):
+    def __init__(self, detail: str = "Too many requests", headers=None):
+        super().__init__(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=detail, headers=headers)
@@ -0,0 +1,41 @@
+# src/explain.py
+"""Query plans for SQLAlchemy statements, on PostgreSQL or SQLite."""
+import re
+
+from sqlalchemy.engine import Connection
+
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+# A full read of a table's rows: SQLite's "SCAN <table>" without an index, or PostgreSQL's sequential scan.
+SEQ_SCAN_PATTERNS = {
+    "postgresql": re.compile(r"Seq Scan on (\w+)"),
+    "sqlite": re.compile(r"\bSCAN (\w+)(?!.*\bUSING\b.*\bINDEX\b)"),
+}
+
+
+def explain(connection: Connection, stmt) -> str:
+    """Return the plan the database would use for ``stmt``, one plan node per line.
+
+    ``connection`` is a synchronous connection; the statement is planned with its bound
+    parameter values but not executed.
+    """
+    compiled = stmt.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return explain_sql(connection, str(compiled), params)
+
+
+def explain_sql(connection: Connection, sql: str, params=()) -> str:
+    """Like ``explain`` for SQL already rendered for the connection's driver, e.g. as captured from a cursor."""
+    rows = connection.exec_driver_sql(EXPLAIN_PREFIXES[connection.dialect.name] + sql, params)
+    # SQLite returns (id, parent, notused, detail) rows; PostgreSQL returns one text column.
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def seq_scans(plan: str, dialect_name: str) -> list:
+    """Names of the tables ``plan`` reads in full rather than through an index."""
+    return SEQ_SCAN_PATTERNS[dialect_name].findall(plan)
@@ -0,0 +1,89 @@
+# src/export.py
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Appointment, Billing
+
+# Rows fetched per round-trip from the server-side cursor, and per chunk written to the response.
+EXPORT_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _format_chunk(rows, fmt: str, header: Optional[list] = None) -> str:
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(header)
+        writer.writerows((value.isoformat() if isinstance(value, (date, time)) else value for value in row.values())
+                         for row in rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(row), default=_to_json) + "\n")
+    return buffer.getvalue()
+
+
+async def stream_export(db: AsyncSession, stmt, fmt: str):
+    """Yield ``stmt``'s rows as CSV or NDJSON text, one chunk of ``EXPORT_CHUNK_SIZE`` rows at a time.
+
+    Rows come from a server-side cursor and skip the ORM identity map, so memory stays flat however
+    many rows match.
+    """
+    result = await db.stream(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+    header = list(result.keys())
+    if fmt == "csv":
+        yield _format_chunk([], fmt, header)
+    async for rows in result.mappings().partitions():
+        yield _format_chunk(rows, fmt)
+
+
+def export_response(db: AsyncSession, stmt, fmt: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(stream_export(db, stmt, fmt), media_type=MEDIA_TYPES[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'})
+
+
+def appointments_export_query(from_date: Optional[date] = None, to_date: Optional[date] = None,
+                              dentist_id: Optional[int] = None):
+    """Appointments on ``from_date`` through ``to_date`` inclusive, optionally for one dentist, in id order."""
+    stmt = select(*Appointment.__table__.columns).order_by(Appointment.id)
+    if from_date:
+        stmt = stmt.filter(Appointment.date >= from_date)
+    if to_date:
+        stmt = stmt.filter(Appointment.date <= to_date)
+    if dentist_id is not None:
+        stmt = stmt.filter(Appointment.dentist_id == dentist_id)
+    return stmt
+
+
+def billing_export_query(from_date: Optional[date] = None, to_date: Optional[date] = None,
+                         dentist_id: Optional[int] = None):
+    """Billing records created on ``from_date`` through ``to_date`` inclusive, in id order.
+
+    ``dentist_id`` keeps the records whose appointment was with that dentist.
+    """
+    stmt = select(*Billing.__table__.columns).order_by(Billing.id)
+    if from_date:
+        stmt = stmt.filter(Billing.created_at >= datetime.combine(from_date, time.min))
+    if to_date:
+        stmt = stmt.filter(Billing.created_at < datetime.combine(to_date + timedelta(days=1), time.min))
+    if dentist_id is not None:
+        stmt = stmt.join(Appointment, Appointment.id == Billing.appointment_id).filter(
+            Appointment.dentist_id == dentist_id)
+    return stmt
@@ -0,0 +1,45 @@
+# src/fieldsets.py
+"""Sparse fieldsets: a ``fields`` query parameter on read routes.
+
+``?fields=id,first_name`` names a subset of the route's response schema. The names are pushed
+down to the SELECT with ``load_only``, so unrequested columns (e.g. a patient's medical history)
+are neither read from the database nor sent to the client, and the response holds just those keys.
+"""
+from typing import Optional
+
+from fastapi import Query
+from sqlalchemy.orm import load_only
+
+from src.exceptions import BadRequestError
+
+
+def parse_fields(fields: Optional[str], schema) -> Optional[list]:
+    """The field names listed in ``fields``, in order and without repeats, or None when it is absent."""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names:
+        raise BadRequestError(detail="fields must name at least one field")
+    unknown = [name for name in names if name not in schema.model_fields]
+    if unknown:
+        raise BadRequestError(detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def sparse_fields(schema):
+    """Dependency for a ``fields`` query parameter over ``schema``; yields a list of names, or None for all."""
+
+    def dependency(fields: Optional[str] = Query(None, description="Comma-separated fields to return; all if omitted")):
+        return parse_fields(fields, schema)
+
+    return dependency
+
+
+def load_fields(model, fields: Optional[list], *always) -> list:
+    """Loader options that read only ``fields``, plus the ``always`` columns, of ``model``.
+
+    Empty when ``fields`` is None. The primary key is always loaded.
+    """
+    if fields is None:
+        return []
+    return [load_only(*(getattr(model, name) for name in fields), *always)]
@@ -0,0 +1,84 @@
+# src/hashing.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import settings
+from src.exceptions import TooManyRequestsError
+
+
+class HashingExecutor:
+    """Bounded thread pool that keeps bcrypt off the event loop.
+
+    Calls beyond ``max_pending`` (running plus queued) are rejected with a 429 instead of
+    piling up behind a login burst. The pool is started on first use and again after ``shutdown``,
+    so the app can go through more than one lifespan.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise TooManyRequestsError(detail="Too many concurrent password operations, retry shortly",
+                                       headers={"Retry-After": "1"})
+        queued_at = time.perf_counter()
+
+        def _job():
+            wait = time.perf_counter() - queued_at
+            with self._lock:
+                self.running += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), _job)
+        finally:
+            self.pending -= 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hashing")
+            return self._executor
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self.pending - self.running,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": self.total_wait / started * 1000 if started else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+hashing_executor = HashingExecutor(settings.hash_pool_size, settings.hash_queue_limit)
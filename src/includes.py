@@ -0,0 +1,61 @@
+# src/includes.py
+"""Compound documents: an ``include`` query parameter on the patient and dentist GETs.
+
+``?include=appointments,billing`` embeds those related collections in the response. Each one is
+loaded with ``selectinload``, i.e. one extra ``IN`` query per collection however many rows it
+has, so a chart screen gets everything in a fixed number of queries instead of one request (or
+one lazy load) per collection.
+"""
+from typing import Optional
+
+from fastapi import Query
+from sqlalchemy.orm import selectinload
+
+from src.exceptions import BadRequestError
+from src.models import Dentist, Patient
+from src.schemas import Appointment, Billing, Insurance, Report
+from src.serialization import dump_rows
+
+# Include name -> (relationship, schema of its rows).
+PATIENT_INCLUDES = {
+    "appointments": (Patient.appointments, Appointment),
+    "billing": (Patient.billing, Billing),
+    "insurance": (Patient.insurances, Insurance),
+    "reports": (Patient.reports, Report),
+}
+DENTIST_INCLUDES = {
+    "appointments": (Dentist.appointments, Appointment),
+    "reports": (Dentist.reports, Report),
+}
+
+
+def parse_include(include: Optional[str], includes: dict) -> list:
+    """The collection names listed in ``include``, in order and without repeats."""
+    if include is None:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in include.split(",") if name.strip()))
+    unknown = [name for name in names if name not in includes]
+    if unknown:
+        raise BadRequestError(detail=f"Unknown include: {', '.join(unknown)}; expected some of "
+                                     f"{', '.join(includes)}")
+    return names
+
+
+def include_param(includes: dict):
+    """Dependency for an ``include`` query parameter over ``includes``; yields a list of names."""
+
+    def dependency(include: Optional[str] = Query(None, description=f"Comma-separated related collections to embed: "
+                                                                     f"{', '.join(includes)}")):
+        return parse_include(include, includes)
+
+    return dependency
+
+
+def load_includes(includes: dict, names: list) -> list:
+    """``selectinload`` options for the ``names`` collections."""
+    return [selectinload(includes[name][0]) for name in names]
+
+
+def included(row, includes: dict, names: list) -> dict:
+    """The ``names`` collections of ``row``, loaded by ``load_includes``, as plain dicts keyed by name."""
+    return {name: dump_rows(getattr(row, includes[name][0].key), includes[name][1]) for name in names}
@@ -1,16 +1,24 @@
 # src/main.py
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from starlette.responses import RedirectResponse
 
+from src.config import settings
 from src.cors import add_cors_middleware
-from src.database import Base, engine
+from src.database import engine
+from src.hashing import hashing_executor
+from src.migrations import migrate, schema_is_current
+from src.response_cache import invalidation_listener
 from src.routes import router
+from src.scheduling import calendar_listener
+from src.serialization import FastJSONResponse
 
 app = FastAPI(
     title="Dentist Appointment API",
     description="API to manage appointments between patients and dentists",
     version="0.1.0",
+    default_response_class=FastJSONResponse if settings.fast_json_responses else JSONResponse,
 )
 
 add_cors_middleware(app)
@@ -20,12 +28,21 @@ app.include_router(router)
 
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
+    async with engine.connect() as conn:
+        if settings.migrate_on_startup:
+            await conn.run_sync(migrate)
+        elif not await conn.run_sync(schema_is_current):
+            raise RuntimeError("Database schema is out of date; run python -m src.migrations")
+    await calendar_listener.start()
+    await invalidation_listener.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
-    pass
+    await calendar_listener.stop()
+    await invalidation_listener.stop()
+    await engine.dispose()
+    hashing_executor.shutdown()
 
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,122 @@
+# src/memory_redis.py
+"""In-process stand-in for the Redis commands ``RedisBackend`` uses.
+
+``CACHE_URL=memory://`` runs the shared-cache code path (generations, WATCH, SCAN) without a Redis
+server, e.g. in development and tests. Everything holding the same ``MemoryRedis`` shares its
+keys, as workers share a server, but only within one process.
+"""
+import fnmatch
+import time
+
+
+class WatchError(Exception):
+    """A watched key changed before ``execute``; the transaction was not applied."""
+
+
+class MemoryRedis:
+    def __init__(self):
+        # key -> (value, expires_at or None)
+        self._data = {}
+        # key -> writes so far, for WATCH
+        self._versions = {}
+
+    def _entry(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _write(self, key, value, expires_at=None):
+        if value is None:
+            self._data.pop(key, None)
+        else:
+            self._data[key] = (value, expires_at)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    async def get(self, key):
+        entry = self._entry(key)
+        return None if entry is None else entry[0]
+
+    async def set(self, key, value, px=None):
+        self._write(key, value, None if px is None else time.monotonic() + px / 1000)
+        return True
+
+    async def incr(self, key):
+        entry = self._entry(key)
+        value = int(entry[0]) + 1 if entry else 1
+        self._write(key, value, entry[1] if entry else None)
+        return value
+
+    async def sadd(self, key, *members):
+        entry = self._entry(key)
+        self._write(key, (entry[0] if entry else set()) | set(members), entry[1] if entry else None)
+        return len(members)
+
+    async def smembers(self, key):
+        entry = self._entry(key)
+        return set(entry[0]) if entry else set()
+
+    async def pexpire(self, key, milliseconds):
+        entry = self._entry(key)
+        if entry is None:
+            return False
+        self._data[key] = (entry[0], time.monotonic() + milliseconds / 1000)
+        return True
+
+    async def delete(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._entry(key) is not None:
+                self._write(key, None)
+                deleted += 1
+        return deleted
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self._data):
+            if (match is None or fnmatch.fnmatchcase(key, match)) and self._entry(key) is not None:
+                yield key
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+
+class MemoryPipeline:
+    """Buffers commands until ``execute``, except between ``watch`` and ``multi``, as redis-py does."""
+
+    def __init__(self, redis: MemoryRedis):
+        self._redis = redis
+        self._watched = {}
+        self._queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._watched.clear()
+        self._queued = []
+
+    async def watch(self, *keys):
+        self._watched.update({key: self._redis._versions.get(key, 0) for key in keys})
+        self._queued = None
+
+    def multi(self):
+        self._queued = []
+
+    def __getattr__(self, name):
+        command = getattr(self._redis, name)
+        if self._queued is None:
+            return command
+
+        def queue(*args, **kwargs):
+            self._queued.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        queued, watched = self._queued or [], self._watched
+        self._queued, self._watched = [], {}
+        if any(self._redis._versions.get(key, 0) != version for key, version in watched.items()):
+            raise WatchError()
+        return [await command(*args, **kwargs) for command, args, kwargs in queued]
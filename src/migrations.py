@@ -0,0 +1,257 @@
+# src/migrations.py
+"""Versioned schema migrations.
+
+``schema_version`` holds a single row with the number of migrations applied. At startup
+``migrate`` reads that row and returns at once when it equals ``LATEST_VERSION``, so a worker
+booting against a current schema runs one query and never reflects the tables. Otherwise each
+pending migration runs in its own transaction together with its version bump; on PostgreSQL the
+transaction first takes an advisory lock and re-reads the version, so of several workers booting
+at once one migrates and the others wait and then find nothing left to do.
+
+Migrations check before they change, so they also apply to databases built by ``create_all``
+before the version table existed. Each one spells out its own DDL instead of reading the models,
+so a version always means the same schema; a model change needs a new migration. Append new
+migrations to ``MIGRATIONS``; never edit or reorder the ones already released.
+
+    python -m src.migrations           # apply pending migrations
+    python -m src.migrations --check   # exit 1 if migrations are pending
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Integer, MetaData, String, Table, \
+    Text, Time, bindparam, column, func, inspect, select, table, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from src.database import Base, engine
+from src.scheduling import appointment_interval
+
+MIGRATION_LOCK_KEY = 4202
+BACKFILL_CHUNK_SIZE = 1000
+
+schema_version = Table("schema_version", Base.metadata, Column("version", Integer, nullable=False))
+
+# The tables as migration 1 creates them, frozen; src.models describes the latest version instead.
+baseline = MetaData()
+insurance_provider = Enum("provider_a", "provider_b", "provider_c", name="insuranceprovider", metadata=baseline)
+
+
+def _id():
+    return Column("id", Integer, primary_key=True, index=True)
+
+
+def _timestamps():
+    return Column("created_at", DateTime), Column("updated_at", DateTime)
+
+
+Table("users", baseline, _id(),
+      Column("username", String, unique=True, index=True, nullable=False),
+      Column("hashed_password", String, nullable=False),
+      Column("role", Enum("patient", "dentist", "admin", name="userrole"), nullable=False),
+      Column("is_active", Boolean), *_timestamps())
+Table("patients", baseline, _id(),
+      Column("first_name", String, nullable=False), Column("last_name", String, nullable=False),
+      Column("email", String, unique=True, nullable=False), Column("phone_number", String),
+      Column("address", String), Column("date_of_birth", DateTime), Column("emergency_contact_name", String),
+      Column("emergency_contact_phone", String), Column("medical_history", Text),
+      Column("insurance_provider", insurance_provider), Column("insurance_policy_number", String), *_timestamps())
+Table("dentists", baseline, _id(),
+      Column("first_name", String, nullable=False), Column("last_name", String, nullable=False),
+      Column("speciality", String), Column("license_number", String), *_timestamps())
+Table("availability", baseline, _id(),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("day_of_week", String, nullable=False), Column("start_time", DateTime, nullable=False),
+      Column("end_time", DateTime, nullable=False))
+Table("availability_rules", baseline, _id(),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("weekdays", Integer, nullable=False), Column("start_time", Time, nullable=False),
+      Column("end_time", Time, nullable=False), Column("valid_from", Date, nullable=False),
+      Column("valid_until", Date), *_timestamps())
+Table("availability_exceptions", baseline, _id(),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("day", Date, nullable=False), Column("start_time", Time), Column("end_time", Time),
+      Column("reason", String), Column("created_at", DateTime))
+Table("appointments", baseline, _id(),
+      Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("date", Date, nullable=False), Column("time", Time, nullable=False), Column("status", String),
+      Column("treatment_type", String, nullable=False), Column("notes", String), Column("cost", Float),
+      *_timestamps())
+Table("billing", baseline, _id(),
+      Column("appointment_id", Integer, ForeignKey("appointments.id"), nullable=False),
+      Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+      Column("amount_due", Float, nullable=False), Column("payment_status", String, nullable=False),
+      Column("payment_method", String), Column("insurance_claim_id", String), *_timestamps())
+Table("insurances", baseline, _id(),
+      Column("provider", insurance_provider, nullable=False), Column("policy_number", String, nullable=False),
+      Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False), *_timestamps())
+Table("reports", baseline, _id(),
+      Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("appointment_id", Integer, ForeignKey("appointments.id"), nullable=False),
+      Column("report_details", Text, nullable=False), *_timestamps())
+Table("notifications", baseline, _id(),
+      Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+      Column("message", String, nullable=False), Column("is_read", Boolean), *_timestamps())
+Table("feedbacks", baseline, _id(),
+      Column("patient_id", Integer, ForeignKey("patients.id"), nullable=False),
+      Column("dentist_id", Integer, ForeignKey("dentists.id"), nullable=False),
+      Column("appointment_id", Integer, ForeignKey("appointments.id"), nullable=False),
+      Column("rating", Integer, nullable=False), Column("comments", Text), *_timestamps())
+Table("token_revocations", baseline, _id(),
+      Column("user_id", Integer, unique=True, index=True, nullable=False),
+      Column("revoked_at", DateTime, nullable=False))
+
+# name -> (table, columns, unique, WHERE clause), as migration 3 creates them.
+INDEXES = {
+    "ix_availability_dentist_start_time": ("availability", "dentist_id, start_time", False, None),
+    "ix_availability_dentist_id_id": ("availability", "dentist_id, id", False, None),
+    "ix_availability_rules_dentist_id": ("availability_rules", "dentist_id", False, None),
+    "ix_availability_exceptions_dentist_day": ("availability_exceptions", "dentist_id, day", False, None),
+    "ix_appointments_dentist_starts_at": ("appointments", "dentist_id, starts_at", False, None),
+    "ix_appointments_patient_id_id": ("appointments", "patient_id, id", False, None),
+    "uq_appointments_dentist_slot": ("appointments", 'dentist_id, "date", "time"', True, "status != 'cancelled'"),
+    "ix_billing_patient_id_id": ("billing", "patient_id, id", False, None),
+    "ix_billing_appointment_id": ("billing", "appointment_id", False, None),
+    "ix_insurances_patient_id": ("insurances", "patient_id", False, None),
+    "ix_reports_patient_id": ("reports", "patient_id", False, None),
+    "ix_reports_dentist_id": ("reports", "dentist_id", False, None),
+    "ix_reports_appointment_id": ("reports", "appointment_id", False, None),
+    "ix_notifications_user_id": ("notifications", "user_id", False, None),
+    "ix_feedbacks_patient_id": ("feedbacks", "patient_id", False, None),
+    "ix_feedbacks_dentist_id": ("feedbacks", "dentist_id", False, None),
+    "ix_feedbacks_appointment_id": ("feedbacks", "appointment_id", False, None),
+}
+
+
+def create_tables(connection: Connection):
+    baseline.create_all(connection)
+
+
+def add_appointment_intervals(connection: Connection):
+    appointments = table("appointments", column("id", Integer), column("date", Date), column("time", Time),
+                         column("treatment_type", String), column("starts_at", DateTime),
+                         column("ends_at", DateTime), column("updated_at", DateTime))
+    existing = {info["name"] for info in inspect(connection).get_columns(appointments.name)}
+    for name in ("starts_at", "ends_at"):
+        if name not in existing:
+            column_type = DateTime().compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {appointments.name} ADD COLUMN {name} {column_type}"))
+
+    pending = (
+        select(appointments.c.id, appointments.c.date, appointments.c.time, appointments.c.treatment_type)
+        .filter(appointments.c.starts_at.is_(None))
+        .limit(BACKFILL_CHUNK_SIZE)
+    )
+    # Keep updated_at as it was: the appointment itself has not changed.
+    backfill = (
+        update(appointments)
+        .where(appointments.c.id == bindparam("appointment_id"))
+        .values(starts_at=bindparam("start"), ends_at=bindparam("end"), updated_at=appointments.c.updated_at)
+    )
+    while rows := connection.execute(pending).all():
+        params = []
+        for appointment_id, appointment_date, appointment_time, treatment_type in rows:
+            start, end = appointment_interval(appointment_date, appointment_time, treatment_type)
+            params.append({"appointment_id": appointment_id, "start": start, "end": end})
+        connection.execute(backfill, params)
+
+    if connection.dialect.name == "postgresql":
+        # SQLite can't add a constraint to an existing column; there the columns stay nullable.
+        connection.execute(text(f"ALTER TABLE {appointments.name} "
+                                "ALTER COLUMN starts_at SET NOT NULL, ALTER COLUMN ends_at SET NOT NULL"))
+
+
+def create_indexes(connection: Connection):
+    appointments = table("appointments", column("dentist_id"), column("date"), column("time"),
+                         column("status", String))
+    live = appointments.c.status != "cancelled"
+    slots = select(appointments.c.dentist_id).filter(live).group_by(
+        appointments.c.dentist_id, appointments.c.date, appointments.c.time).having(func.count() > 1)
+    double_booked = connection.execute(select(func.count()).select_from(slots.subquery())).scalar()
+    if double_booked:
+        raise RuntimeError(f"{double_booked} dentist slots are booked more than once; cancel the extra "
+                           "appointments before creating uq_appointments_dentist_slot")
+    for name, (table_name, columns, unique, where) in INDEXES.items():
+        connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} "
+                                f"ON {table_name} ({columns})" + (f" WHERE {where}" if where else "")))
+
+
+MIGRATIONS = [
+    ("create tables", create_tables),
+    ("appointments.starts_at and ends_at", add_appointment_intervals),
+    ("indexes for bookings and list routes", create_indexes),
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(schema_version.name):
+        return 0
+    return connection.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def schema_is_current(connection: Connection) -> bool:
+    """The startup fast path: one query against ``schema_version``, no reflection."""
+    try:
+        version = connection.execute(select(schema_version.c.version)).scalar()
+    except DBAPIError:
+        # No version table yet.
+        connection.rollback()
+        return False
+    connection.commit()
+    return version == LATEST_VERSION
+
+
+def upgrade(connection: Connection) -> int:
+    """Apply the pending migrations, one transaction each, and return the new schema version."""
+    while True:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        version = current_version(connection)
+        if version >= LATEST_VERSION:
+            connection.commit()
+            return version
+        _, migration = MIGRATIONS[version]
+        migration(connection)
+        if version == 0:
+            schema_version.create(connection, checkfirst=True)
+            connection.execute(schema_version.insert().values(version=1))
+        else:
+            connection.execute(schema_version.update().values(version=version + 1))
+        connection.commit()
+
+
+def migrate(connection: Connection) -> int:
+    if schema_is_current(connection):
+        return LATEST_VERSION
+    return upgrade(connection)
+
+
+async def _main(args):
+    try:
+        async with engine.connect() as conn:
+            if args.check:
+                current = await conn.run_sync(schema_is_current)
+                print("up to date" if current else "migrations pending")
+                return 0 if current else 1
+            before = await conn.run_sync(current_version)
+            after = await conn.run_sync(upgrade)
+    finally:
+        await engine.dispose()
+    for number, (name, _) in enumerate(MIGRATIONS[before:after], before + 1):
+        print(f"applied {number}: {name}")
+    print(f"schema at version {after}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="report whether migrations are pending and exit")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
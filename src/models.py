@@ -1,11 +1,12 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Boolean, Text, Float, Date, Time
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Boolean, Text, Float, Date, Time, Index, \
+    text
 from sqlalchemy.dialects.postgresql import ENUM as PGEnum
 from sqlalchemy.orm import relationship
 
-from src.constants import UserRole, InsuranceProvider
-from src.main import Base
+from src.constants import UserRole, InsuranceProvider, TREATMENT_DURATIONS, DEFAULT_TREATMENT_DURATION
+from src.database import Base
 
 user_role_enum = PGEnum('patient', 'dentist', 'admin', name='userrole', create_type=False)
 appointment_status_enum = PGEnum('pending', 'confirmed', 'cancelled', name='appointmentstatus', create_type=False)
@@ -49,7 +50,10 @@ class Patient(Base):
     insurance_policy_number = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    appointments = relationship("Appointment", backref="patient")
+    appointments = relationship("Appointment", backref="patient", order_by="Appointment.id")
+    billing = relationship("Billing", order_by="Billing.id")
+    insurances = relationship("Insurance", order_by="Insurance.id")
+    reports = relationship("Report", order_by="Report.id")
 
 
 class Dentist(Base):
@@ -62,7 +66,8 @@ class Dentist(Base):
     availability = relationship("Availability", backref="dentist")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    appointments = relationship("Appointment", backref="dentist")
+    appointments = relationship("Appointment", backref="dentist", order_by="Appointment.id")
+    reports = relationship("Report", order_by="Report.id")
 
 
 class Availability(Base):
@@ -72,6 +77,51 @@ class Availability(Base):
     day_of_week = Column(String, nullable=False)
     start_time = Column(DateTime, nullable=False)  # Use DateTime
     end_time = Column(DateTime, nullable=False)  # Use DateTime
+    __table_args__ = (
+        Index("ix_availability_dentist_start_time", "dentist_id", "start_time"),  # calendar loads
+        Index("ix_availability_dentist_id_id", "dentist_id", "id"),  # keyset-paginated list
+    )
+
+
+class AvailabilityRule(Base):
+    """A standing weekly window: every weekday in the bitmask (bit 0 = Monday), between two times of day."""
+    __tablename__ = "availability_rules"
+    id = Column(Integer, primary_key=True, index=True)
+    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False, index=True)
+    weekdays = Column(Integer, nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    valid_from = Column(Date, nullable=False)
+    valid_until = Column(Date, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AvailabilityException(Base):
+    """A dated hole in a dentist's recurring rules; no times means the whole day is off."""
+    __tablename__ = "availability_exceptions"
+    id = Column(Integer, primary_key=True, index=True)
+    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    start_time = Column(Time, nullable=True)
+    end_time = Column(Time, nullable=True)
+    reason = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_availability_exceptions_dentist_day", "dentist_id", "day"),
+    )
+
+
+def appointment_starts_at(context):
+    params = context.get_current_parameters()
+    return datetime.combine(params["date"], params["time"])
+
+
+def appointment_ends_at(context):
+    params = context.get_current_parameters()
+    treatment_type = getattr(params["treatment_type"], "value", params["treatment_type"])
+    minutes = TREATMENT_DURATIONS.get(treatment_type, DEFAULT_TREATMENT_DURATION)
+    return datetime.combine(params["date"], params["time"]) + timedelta(minutes=minutes)
 
 
 class Appointment(Base):
@@ -85,8 +135,19 @@ class Appointment(Base):
     treatment_type = Column(String, nullable=False)
     notes = Column(String, nullable=True)
     cost = Column(Float, nullable=True)
+    # date + time and the end implied by the treatment, kept together so range queries can use one index.
+    starts_at = Column(DateTime, nullable=False, default=appointment_starts_at)
+    ends_at = Column(DateTime, nullable=False, default=appointment_ends_at)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_appointments_dentist_starts_at", "dentist_id", "starts_at"),
+        Index("ix_appointments_patient_id_id", "patient_id", "id"),
+        # One live booking per dentist and start time, whichever worker inserts it. Overlaps between
+        # different start times are checked under an advisory lock in dental_service.save_appointment.
+        Index("uq_appointments_dentist_slot", "dentist_id", "date", "time", unique=True,
+              postgresql_where=text("status != 'cancelled'"), sqlite_where=text("status != 'cancelled'")),
+    )
 
 
 class Billing(Base):
@@ -100,6 +161,10 @@ class Billing(Base):
     insurance_claim_id = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_billing_patient_id_id", "patient_id", "id"),
+        Index("ix_billing_appointment_id", "appointment_id"),
+    )
 
 
 class Insurance(Base):
@@ -107,7 +172,7 @@ class Insurance(Base):
     id = Column(Integer, primary_key=True, index=True)
     provider = Column(Enum(InsuranceProvider), nullable=False)
     policy_number = Column(String, nullable=False)
-    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -115,9 +180,9 @@ class Insurance(Base):
 class Report(Base):
     __tablename__ = "reports"
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
-    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False)
-    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False, index=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False, index=True)
     report_details = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -126,7 +191,7 @@ class Report(Base):
 class Notification(Base):
     __tablename__ = "notifications"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     message = Column(String, nullable=False)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -136,10 +201,17 @@ class Notification(Base):
 class Feedback(Base):
     __tablename__ = "feedbacks"
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
-    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False)
-    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False, index=True)
+    dentist_id = Column(Integer, ForeignKey("dentists.id"), nullable=False, index=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=False, index=True)
     rating = Column(Integer, nullable=False)
     comments = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Revocation(Base):
+    __tablename__ = "token_revocations"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, unique=True, index=True, nullable=False)  # No FK: outlives deleted users
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,50 @@
+# src/pagination.py
+import base64
+import json
+from typing import Optional
+
+from fastapi import Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.exceptions import BadRequestError
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """``limit``/``cursor`` query parameters for keyset-paginated list routes."""
+
+    def __init__(self, limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+                 cursor: Optional[str] = Query(None, description=f"The {NEXT_CURSOR_HEADER} of the previous page")):
+        self.limit = limit
+        self.cursor = cursor
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise BadRequestError(detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise BadRequestError(detail="Invalid cursor")
+    return last_id
+
+
+async def paginate(db: AsyncSession, stmt, model, page: PageParams, response: Response) -> list:
+    """Run ``stmt`` one page at a time, seeking past the cursor on ``model.id`` rather than using OFFSET.
+
+    Sets the ``X-Next-Cursor`` response header when another page follows.
+    """
+    if page.cursor is not None:
+        stmt = stmt.filter(model.id > decode_cursor(page.cursor))
+    result = await db.execute(stmt.order_by(model.id).limit(page.limit + 1))
+    rows = result.scalars().all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
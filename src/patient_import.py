@@ -0,0 +1,241 @@
+# src/patient_import.py
+"""Bulk patient import from CSV or NDJSON.
+
+Rows are read from an async byte stream and validated with ``PatientCreate`` in chunks of
+``BULK_CHUNK_SIZE``. Each chunk is written with COPY on PostgreSQL, or as one executemany INSERT on
+other databases, and committed on its own, so only one chunk is in memory at a time. Emails that
+already exist in the table or appear earlier in the file are reported as duplicates.
+
+    python -m src.patient_import patients.csv --errors errors.ndjson
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import sys
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import column, insert, select, table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.crud import BULK_CHUNK_SIZE
+from src.database import SessionLocal, engine
+from src.migrations import upgrade
+from src.models import Patient
+from src.schemas import PatientCreate
+from src.utils import parse_timestamps
+
+IMPORT_COLUMNS = list(PatientCreate.model_fields) + ["created_at", "updated_at"]
+STAGING_TABLE = "patient_import_staging"
+READ_SIZE = 64 * 1024
+# A quoted field may span lines, but an unclosed quote must not swallow the rest of the upload.
+MAX_RECORD_LINES = 100
+InsuranceProvider = Patient.insurance_provider.type.enum_class
+
+
+async def iter_lines(chunks):
+    """Split an async stream of UTF-8 byte chunks into lines without buffering the whole stream."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+def ends_quoted(line: str, quoted: bool = False) -> bool:
+    """Whether a CSV record is inside a quoted field after ``line``, given whether it was before it.
+
+    As in ``csv``, only a quote opening a field starts quoting; one inside an unquoted field is literal.
+    """
+    if not quoted and '"' not in line:
+        return False
+    field_start, escape = True, False
+    for char in line:
+        if quoted:
+            if char == '"':
+                quoted, escape = False, True
+            continue
+        # A quote right after a closing one is an escaped quote, and reopens the field.
+        quoted = char == '"' and (field_start or escape)
+        escape = False
+        field_start = char == ","
+    return quoted
+
+
+async def iter_records(chunks, fmt: str):
+    """Yield ``(line_number, record)`` pairs, where record is a dict or an error message for a bad line."""
+    line_number = 0
+    if fmt == "ndjson":
+        async for line in iter_lines(chunks):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, record if isinstance(record, dict) else "Expected a JSON object"
+        return
+
+    header, pending, start, quoted = None, [], 0, False
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not pending:
+            start = line_number
+        pending.append(line)
+        quoted = ends_quoted(line, quoted)
+        if quoted:
+            if len(pending) < MAX_RECORD_LINES:
+                # A quoted field continues on the next line.
+                continue
+            yield start, f"Quoted field not closed within {MAX_RECORD_LINES} lines"
+            pending, quoted = [], False
+            continue
+        row = next(csv.reader(["\n".join(pending)]), [])
+        pending = []
+        if header is None:
+            header = [name.strip() for name in row]
+        elif any(row):
+            if len(row) != len(header):
+                yield start, f"Expected {len(header)} fields, got {len(row)}"
+            else:
+                yield start, {name: value or None for name, value in zip(header, row)}
+    if pending:
+        yield start, "Quoted field not closed by the end of the file"
+
+
+def to_row(record: dict, now: datetime) -> dict:
+    """Validate one record with ``PatientCreate`` and convert it to ``patients`` column values."""
+    row = parse_timestamps(PatientCreate(**record).dict(), "date_of_birth")
+    if row["insurance_provider"]:
+        row["insurance_provider"] = InsuranceProvider(row["insurance_provider"].value)
+    row["created_at"] = row["updated_at"] = now
+    return row
+
+
+async def _copy_rows(db: AsyncSession, rows: list) -> set:
+    # COPY into a staging table so a concurrent insert of the same email is skipped rather than
+    # aborting the whole COPY.
+    names = ", ".join(IMPORT_COLUMNS)
+    await db.execute(text(f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+                          f"SELECT {names} FROM {Patient.__tablename__} WITH NO DATA"))
+    connection = await (await db.connection()).get_raw_connection()
+    records = [
+        tuple(value.name if isinstance(value, InsuranceProvider) else value for value in row.values())
+        for row in rows
+    ]
+    await connection.driver_connection.copy_records_to_table(STAGING_TABLE, records=records, columns=IMPORT_COLUMNS)
+    staging = table(STAGING_TABLE, *(column(name) for name in IMPORT_COLUMNS))
+    stmt = (
+        postgresql.insert(Patient)
+        .from_select(IMPORT_COLUMNS, select(staging))
+        .on_conflict_do_nothing(index_elements=[Patient.email])
+        .returning(Patient.email)
+    )
+    return set((await db.execute(stmt)).scalars())
+
+
+async def write_chunk(db: AsyncSession, rows: list) -> set:
+    """Insert the rows whose email is not already taken, commit, and return the inserted emails."""
+    existing = await db.execute(select(Patient.email).filter(Patient.email.in_([row["email"] for row in rows])))
+    taken = set(existing.scalars())
+    rows = [row for row in rows if row["email"] not in taken]
+    inserted = set()
+    if rows and db.bind.dialect.name == "postgresql":
+        inserted = await _copy_rows(db, rows)
+    elif rows:
+        await db.execute(insert(Patient), rows)
+        inserted = {row["email"] for row in rows}
+    await db.commit()
+    return inserted
+
+
+async def import_patients(db: AsyncSession, chunks, fmt: str = "csv", on_error=None) -> dict:
+    """Stream patients from ``chunks`` into the ``patients`` table.
+
+    ``on_error`` is called with a ``{"line", "email", "error"}`` dict for every row that was not
+    imported. Returns the inserted, duplicate and invalid row counts.
+    """
+    summary = {"inserted": 0, "duplicates": 0, "invalid": 0}
+    seen = set()
+    batch = []
+
+    def reject(kind: str, line: int, email, error: str):
+        summary[kind] += 1
+        if on_error:
+            on_error({"line": line, "email": email, "error": error})
+
+    async def flush():
+        inserted = await write_chunk(db, [row for _, row in batch])
+        for line, row in batch:
+            if row["email"] in inserted:
+                summary["inserted"] += 1
+            else:
+                reject("duplicates", line, row["email"], "Email already registered")
+        batch.clear()
+
+    now = datetime.utcnow()
+    async for line, record in iter_records(chunks, fmt):
+        if isinstance(record, str):
+            reject("invalid", line, None, record)
+            continue
+        try:
+            row = to_row(record, now)
+        except (TypeError, ValueError, ValidationError) as e:
+            reject("invalid", line, record.get("email"), str(e))
+            continue
+        if row["email"] in seen:
+            reject("duplicates", line, row["email"], "Email appears earlier in the file")
+            continue
+        seen.add(row["email"])
+        batch.append((line, row))
+        if len(batch) >= BULK_CHUNK_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    return summary
+
+
+async def _read_file(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+async def _main(args):
+    errors = open(args.errors, "w") if args.errors else sys.stderr
+    try:
+        async with engine.connect() as conn:
+            await conn.run_sync(upgrade)
+        async with SessionLocal() as db:
+            summary = await import_patients(db, _read_file(args.path), args.format,
+                                            on_error=lambda error: errors.write(json.dumps(error) + "\n"))
+    finally:
+        if errors is not sys.stderr:
+            errors.close()
+        await engine.dispose()
+    print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None,
+                        help="defaults to the file extension")
+    parser.add_argument("--errors", help="write the per-row error report here as NDJSON instead of stderr")
+    args = parser.parse_args()
+    args.format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
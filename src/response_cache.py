@@ -0,0 +1,298 @@
+# src/response_cache.py
+"""Cache for read-mostly GET responses: filled on read, invalidated by the writers.
+
+Entries are grouped into scopes, e.g. one dentist or every availability page. Handlers read with
+``get_or_load``. On a miss only one caller per key runs the loader; concurrent callers for the same
+key wait for its result (single flight), so an entry expiring under load costs one query, not one
+per request. Create/update/delete handlers call ``publish_invalidation`` on the scopes they
+touched once their write has committed.
+
+Values must be JSON-compatible (see ``row_values``) so that every backend stores the same thing.
+The backend is in-process by default: each worker caches for itself, and on PostgreSQL
+invalidations reach the other workers through NOTIFY, as calendar changes do. Setting
+``CACHE_URL`` to a Redis URL shares one cache between all workers instead; that needs the
+optional ``redis`` package. ``CACHE_URL=memory://`` runs that backend on an in-process stand-in.
+
+Each scope has a generation that invalidating it bumps. A load records the generation it started
+under and its result is stored only if that is still current, so a load that raced a write, in
+this worker or another, doesn't put the old rows back.
+"""
+import asyncio
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import LRUCache
+from src.config import settings
+from src.database import engine
+from src.memory_redis import MemoryRedis, WatchError
+
+INVALIDATION_CHANNEL = "response_cache_invalidations"
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+NOTIFY_PAYLOAD_LIMIT = 7999
+# Keys deleted per round trip when clearing a Redis cache.
+CLEAR_BATCH = 500
+# How long Redis keeps a scope's generation after its last invalidation; far longer than any load.
+GENERATION_TTL = 24 * 3600
+
+
+def row_values(row) -> dict:
+    """A model instance's column values as a JSON-compatible dict."""
+    return jsonable_encoder({column.name: getattr(row, column.name) for column in row.__table__.columns})
+
+
+class LocalBackend:
+    """Per-process LRU store."""
+
+    def __init__(self, maxsize: int, max_ttl: float):
+        self._entries = LRUCache(maxsize, max_ttl, on_evict=self._forget)
+        self._scopes = {}
+        self._key_scopes = {}
+        self._generations = {}
+
+    async def get(self, key: str):
+        return self._entries.get(key)
+
+    async def generation(self, scope: str) -> int:
+        return self._generations.get(scope, 0)
+
+    async def set(self, key: str, value, ttl: float, scope: str, generation: int):
+        if self._generations.get(scope, 0) != generation:
+            return
+        self._entries.set(key, value, expires_at=time.monotonic() + ttl)
+        self._scopes.setdefault(scope, set()).add(key)
+        self._key_scopes[key] = scope
+
+    def _forget(self, key: str):
+        # Evicted or expired, so the scope needn't track it until its next invalidation.
+        scope = self._key_scopes.pop(key, None)
+        keys = self._scopes.get(scope)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    async def invalidate(self, scope: str):
+        self._generations[scope] = self._generations.get(scope, 0) + 1
+        for key in self._scopes.pop(scope, ()):
+            self._entries.delete(key)
+            self._key_scopes.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+        self._scopes.clear()
+        self._key_scopes.clear()
+        self._generations.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
+
+
+class RedisBackend:
+    """Store shared by every worker. Each scope keeps a set of its keys so it can be dropped at once."""
+
+    PREFIX = "dental:"
+
+    def __init__(self, client, watch_error=WatchError):
+        self._redis = client
+        self._watch_error = watch_error
+
+    @classmethod
+    def from_url(cls, url: str):
+        if url.startswith("memory://"):
+            return cls(MemoryRedis())
+        # Optional dependency, only needed when CACHE_URL is a Redis URL.
+        from redis import asyncio as redis
+        from redis.exceptions import WatchError as RedisWatchError
+
+        return cls(redis.from_url(url), RedisWatchError)
+
+    def _generation_key(self, scope: str) -> str:
+        return f"{self.PREFIX}generation:{scope}"
+
+    async def get(self, key: str):
+        raw = await self._redis.get(self.PREFIX + key)
+        return None if raw is None else json.loads(raw)
+
+    async def generation(self, scope: str) -> int:
+        return int(await self._redis.get(self._generation_key(scope)) or 0)
+
+    async def set(self, key: str, value, ttl: float, scope: str, generation: int):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            # WATCH aborts the write if any worker invalidates the scope between this check and EXEC.
+            await pipe.watch(self._generation_key(scope))
+            if int(await pipe.get(self._generation_key(scope)) or 0) != generation:
+                return
+            pipe.multi()
+            pipe.set(self.PREFIX + key, json.dumps(value), px=int(ttl * 1000))
+            pipe.sadd(self.PREFIX + scope, self.PREFIX + key)
+            pipe.pexpire(self.PREFIX + scope, int(ttl * 1000))
+            try:
+                await pipe.execute()
+            except self._watch_error:
+                pass
+
+    async def invalidate(self, scope: str):
+        # The generation goes first: a load that read the old one can no longer store once the keys are gone.
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incr(self._generation_key(scope))
+            pipe.pexpire(self._generation_key(scope), GENERATION_TTL * 1000)
+            await pipe.execute()
+        keys = await self._redis.smembers(self.PREFIX + scope)
+        await self._redis.delete(self.PREFIX + scope, *keys)
+
+    async def clear(self):
+        """Delete every key under ``PREFIX``, a batch at a time; SCAN doesn't block the server as KEYS would."""
+        batch = []
+        async for key in self._redis.scan_iter(match=self.PREFIX + "*", count=CLEAR_BATCH):
+            batch.append(key)
+            if len(batch) == CLEAR_BATCH:
+                await self._redis.delete(*batch)
+                batch.clear()
+        if batch:
+            await self._redis.delete(*batch)
+
+    def stats(self) -> dict:
+        return {}
+
+
+class ResponseCache:
+    """Single-flight read-through cache in front of a backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._inflight = {}
+        self.loads = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, scope: str, suffix, loader, ttl: float):
+        """Return the cached value for ``suffix`` in ``scope``, or ``await loader()`` and cache it for ``ttl`` seconds.
+
+        A None result is returned but not cached.
+        """
+        key = f"{scope}:{suffix}"
+        while True:
+            value = await self.backend.get(key)
+            if value is not None:
+                return value
+            flight = self._inflight.get(key)
+            if flight is None:
+                return await self._load(scope, key, loader, ttl)
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The request that was loading went away; try again, perhaps loading ourselves.
+
+    async def _load(self, scope: str, key: str, loader, ttl: float):
+        flight = asyncio.get_running_loop().create_future()
+        self._inflight[key] = flight
+        self.loads += 1
+        try:
+            generation = await self.backend.generation(scope)
+            value = await loader()
+            if value is not None:
+                await self.backend.set(key, value, ttl, scope, generation)
+        except Exception as e:
+            self._land(key, flight)
+            flight.set_exception(e)
+            # Mark it retrieved, so an error no other request waited for isn't logged as unhandled.
+            flight.exception()
+            raise
+        except BaseException:
+            self._land(key, flight)
+            flight.cancel()
+            raise
+        self._land(key, flight)
+        flight.set_result(value)
+        return value
+
+    def _land(self, key: str, flight):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    async def invalidate(self, *scopes: str):
+        for scope in scopes:
+            # Requests arriving after the write start a fresh load instead of joining one that may predate it.
+            for key in [key for key in self._inflight if key.startswith(f"{scope}:")]:
+                del self._inflight[key]
+            await self.backend.invalidate(scope)
+
+    async def clear(self):
+        self._inflight.clear()
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__, "loads": self.loads, "coalesced": self.coalesced,
+                **self.backend.stats()}
+
+
+def make_backend():
+    if settings.cache_url:
+        return RedisBackend.from_url(settings.cache_url)
+    return LocalBackend(settings.response_cache_size, max(settings.dentist_cache_ttl, settings.availability_cache_ttl))
+
+
+response_cache = ResponseCache(make_backend())
+
+
+def notify_payloads(scopes):
+    """Comma-joined batches of ``scopes``, each short enough for one NOTIFY."""
+    payload = ""
+    for scope in dict.fromkeys(scopes):
+        if payload and len(f"{payload},{scope}".encode()) > NOTIFY_PAYLOAD_LIMIT:
+            yield payload
+            payload = ""
+        payload = f"{payload},{scope}" if payload else scope
+    if payload:
+        yield payload
+
+
+async def publish_invalidation(db: AsyncSession, *scopes: str):
+    """Invalidate ``scopes`` here and, with the in-process backend, in every other worker.
+
+    Call after the write commits. Other workers hear about it through PostgreSQL NOTIFY; a Redis
+    backend is already shared, and on other databases there is only this process to tell.
+    """
+    await response_cache.invalidate(*scopes)
+    if isinstance(response_cache.backend, LocalBackend) and db.bind.dialect.name == "postgresql":
+        payloads = list(notify_payloads(scopes))
+        for payload in payloads:
+            await db.execute(select(func.pg_notify(INVALIDATION_CHANNEL, payload)))
+        if payloads:
+            await db.commit()
+
+
+class InvalidationListener:
+    """Applies other workers' ``publish_invalidation`` calls to this process's cache."""
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self._connection = None
+        # Invalidations scheduled from the notify callback, held so they aren't collected mid-run.
+        self._pending = set()
+
+    async def start(self):
+        if not isinstance(self.cache.backend, LocalBackend) or engine.dialect.name != "postgresql":
+            return
+        self._connection = await engine.connect()
+        raw_connection = await self._connection.get_raw_connection()
+        await raw_connection.driver_connection.add_listener(INVALIDATION_CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        task = asyncio.get_running_loop().create_task(self.cache.invalidate(*payload.split(",")))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def stop(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+invalidation_listener = InvalidationListener(response_cache)
@@ -0,0 +1,85 @@
+# src/revocation.py
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.models import Revocation
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over integer keys: no false negatives, rare false positives."""
+
+    def __init__(self, size_bits: int = 1 << 16, hash_count: int = 4):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self._bits = bytearray(size_bits // 8)
+
+    def _positions(self, key: int):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=8 * self.hash_count).digest()
+        for i in range(self.hash_count):
+            yield int.from_bytes(digest[i * 8:(i + 1) * 8], "big") % self.size_bits
+
+    def add(self, key: int):
+        for position in self._positions(key):
+            self._bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, key: int) -> bool:
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """In-memory view of the ``token_revocations`` table.
+
+    The Bloom filter answers "definitely not revoked" without a query; only positives are
+    confirmed against the table. It is rebuilt from the table every ``refresh_seconds`` so
+    revocations written by other workers are picked up.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._filter = BloomFilter()
+        self._refreshed_at = None
+
+    def add(self, user_id: int):
+        self._filter.add(user_id)
+
+    def clear(self):
+        self._filter = BloomFilter()
+        self._refreshed_at = None
+
+    async def refresh_if_stale(self, db: AsyncSession):
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        bloom = BloomFilter()
+        for user_id in (await db.execute(select(Revocation.user_id))).scalars():
+            bloom.add(user_id)
+        self._filter = bloom
+        self._refreshed_at = time.monotonic()
+
+    async def is_revoked(self, db: AsyncSession, user_id: int, issued_at: float) -> bool:
+        await self.refresh_if_stale(db)
+        if user_id not in self._filter:
+            return False
+        result = await db.execute(select(Revocation.revoked_at).filter(Revocation.user_id == user_id))
+        revoked_at = result.scalars().first()
+        return revoked_at is not None and issued_at <= revoked_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+async def revoke_tokens(db: AsyncSession, *user_ids: int):
+    """Reject every token issued to ``user_ids`` up to now; the caller commits."""
+    revoked_at = datetime.utcnow()
+    result = await db.execute(select(Revocation).filter(Revocation.user_id.in_(user_ids)))
+    existing = {db_revocation.user_id: db_revocation for db_revocation in result.scalars()}
+    for user_id in user_ids:
+        if user_id in existing:
+            existing[user_id].revoked_at = revoked_at
+        else:
+            db.add(Revocation(user_id=user_id, revoked_at=revoked_at))
+        revocation_filter.add(user_id)
+
+
+revocation_filter = RevocationFilter(settings.revocation_refresh_seconds)
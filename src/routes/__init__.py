@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 from src.routes import auth, user, appointment, patient, dentist, billing, availability, insurance, reports, \
-    notifications, feedback
+    notifications, feedback, metrics
 
 router = APIRouter()
 
@@ -16,3 +16,4 @@ router.include_router(insurance.router, prefix="/insurance")
 router.include_router(reports.router, prefix="/reports")
 router.include_router(notifications.router, prefix="/notifications")
 router.include_router(feedback.router, prefix="/feedback")
+router.include_router(metrics.router, prefix="/metrics", include_in_schema=False)
@@ -1,68 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import date, datetime
+from typing import Any, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth import get_current_user
-from src.database import get_db
-from src.dental_service import create_appointment, get_patient_by_id, get_appointments_by_patient_id
+from src.conditional import if_match_criteria, not_modified, set_version_headers
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
+from src.dental_service import create_appointment, create_appointments_batch, get_appointments_by_patient_id, \
+    get_appointments_in_range, patient_exists, save_appointment
+from src.export import appointments_export_query, export_response
+from src.fieldsets import load_fields, sparse_fields
 from src.models import User as UserModel, Appointment
-from src.schemas import AppointmentCreate, Appointment as AppointmentSchema
+from src.pagination import PageParams
+from src.scheduling import publish_calendar_change
+from src.serialization import item_response, list_response
+from src.schemas import AppointmentCreate, Appointment as AppointmentSchema, AppointmentBatchResult, BulkDelete, \
+    BulkDeleteResult, FileFormat
+from src.utils import naive_utc
 
 router = APIRouter()
 
 
 @router.post("/dental/appointments", response_model=AppointmentSchema, tags=["Appointments"],
-             description="Create a new dental appointment.")
+             description="Create a new dental appointment; 409 if the dentist is already booked then.")
 async def create_appointment_route(appointment: AppointmentCreate, current_user: UserModel = Depends(get_current_user),
-                                   db: Session = Depends(get_db)):
-    patient = get_patient_by_id(db=db, patient_id=appointment.patient_id)
-    if not patient:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    db_appointment = create_appointment(db=db, appointment=appointment)
+                                   db: AsyncSession = Depends(get_db)):
+    db_appointment = await create_appointment(db=db, appointment=appointment)
     return db_appointment
 
 
+@router.post("/dental/appointments/batch", response_model=list[AppointmentBatchResult], tags=["Appointments"],
+             description="Book many appointments in one transaction, with a created/conflict/invalid result per item.")
+async def create_appointments_batch_route(appointments: list[dict[str, Any]] = Body(...),
+                                          current_user: UserModel = Depends(get_current_user),
+                                          db: AsyncSession = Depends(get_db)):
+    return await create_appointments_batch(db=db, payloads=appointments)
+
+
 @router.get("/dental/patients/{patient_id}/appointments", response_model=list[AppointmentSchema], tags=["Appointments"],
-            description="Get all appointments for a specific patient.")
-async def get_appointments_by_patient(patient_id: int, current_user: UserModel = Depends(get_current_user),
-                                      db: Session = Depends(get_db)):
-    patient = get_patient_by_id(db=db, patient_id=patient_id)
-    if not patient:
+            description="Get all appointments for a specific patient, one page at a time.")
+async def get_appointments_by_patient(patient_id: int, response: Response, page: PageParams = Depends(),
+                                      fields: Optional[list] = Depends(sparse_fields(AppointmentSchema)),
+                                      current_user: UserModel = Depends(get_current_user),
+                                      db: AsyncSession = Depends(get_read_db)):
+    if not await patient_exists(db=db, patient_id=patient_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    appointments = get_appointments_by_patient_id(db=db, patient_id=patient_id)
-    return appointments
+    appointments = await get_appointments_by_patient_id(db=db, patient_id=patient_id, page=page, response=response,
+                                                        options=load_fields(Appointment, fields))
+    return list_response(appointments, AppointmentSchema, response, fields)
+
+
+@router.get("/dental/appointments", response_model=list[AppointmentSchema], tags=["Appointments"],
+            description="Get a dentist's appointments overlapping a time range, in start order.")
+async def get_appointments_in_range_route(dentist_id: int, from_time: datetime = Query(..., alias="from"),
+                                          to_time: datetime = Query(..., alias="to"),
+                                          fields: Optional[list] = Depends(sparse_fields(AppointmentSchema)),
+                                          current_user: UserModel = Depends(get_current_user),
+                                          db: AsyncSession = Depends(get_read_db)):
+    from_time, to_time = naive_utc(from_time), naive_utc(to_time)
+    if from_time >= to_time:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="from must be before to")
+    appointments = await get_appointments_in_range(db=db, dentist_id=dentist_id, start=from_time, end=to_time,
+                                                   options=load_fields(Appointment, fields))
+    return list_response(appointments, AppointmentSchema, fields=fields)
+
+
+@router.get("/dental/appointments/export", tags=["Appointments"],
+            description="Stream every appointment as CSV or NDJSON, optionally filtered by date range and dentist.")
+async def export_appointments(format: FileFormat = FileFormat.ndjson,
+                              from_date: Optional[date] = Query(None, alias="from"),
+                              to_date: Optional[date] = Query(None, alias="to"), dentist_id: Optional[int] = None,
+                              current_user: UserModel = Depends(get_current_user),
+                              db: AsyncSession = Depends(get_read_db)):
+    stmt = appointments_export_query(from_date, to_date, dentist_id)
+    return export_response(db, stmt, format.value, "appointments")
 
 
 @router.get("/dental/appointments/{appointment_id}", response_model=AppointmentSchema, tags=["Appointments"],
             description="Get details of a specific appointment.")
-async def get_appointment(appointment_id: int, current_user: UserModel = Depends(get_current_user),
-                          db: Session = Depends(get_db)):
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+async def get_appointment(appointment_id: int, request: Request, response: Response,
+                          fields: Optional[list] = Depends(sparse_fields(AppointmentSchema)),
+                          current_user: UserModel = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    if cached := await not_modified(db, Appointment, appointment_id, request):
+        return cached
+    result = await db.execute(select(Appointment).filter(Appointment.id == appointment_id)
+                              .options(*load_fields(Appointment, fields, Appointment.updated_at)))
+    appointment = result.scalars().first()
     if not appointment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
-    return appointment
+    set_version_headers(response, appointment.updated_at)
+    return item_response(appointment, AppointmentSchema, response, fields)
 
 
 @router.put("/dental/appointments/{appointment_id}", response_model=AppointmentSchema, tags=["Appointments"],
-            description="Update a specific appointment.")
-async def update_appointment(appointment_id: int, appointment: AppointmentCreate,
-                             current_user: UserModel = Depends(get_current_user), db: Session = Depends(get_db)):
-    db_appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+            description="Update a specific appointment; 409 if the dentist is already booked then, 412 if it "
+                        "changed since the version in If-Match.")
+async def update_appointment(appointment_id: int, appointment: AppointmentCreate, request: Request,
+                             response: Response, current_user: UserModel = Depends(get_current_user),
+                             db: AsyncSession = Depends(get_db)):
+    db_appointment = await save_appointment(db, appointment, appointment_id, if_match_criteria(request, Appointment))
     if not db_appointment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
-    for key, value in appointment.dict().items():
-        setattr(db_appointment, key, value)
-    db.commit()
-    db.refresh(db_appointment)
+    set_version_headers(response, db_appointment["updated_at"])
     return db_appointment
 
 
 @router.delete("/dental/appointments/{appointment_id}", response_model=dict, tags=["Appointments"],
                description="Delete a specific appointment.")
 async def delete_appointment(appointment_id: int, current_user: UserModel = Depends(get_current_user),
-                             db: Session = Depends(get_db)):
-    db_appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
-    if not db_appointment:
+                             db: AsyncSession = Depends(get_db)):
+    dentist_id = await delete_by_id(db, Appointment, appointment_id, returning=Appointment.dentist_id)
+    if dentist_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment not found")
-    db.delete(db_appointment)
-    db.commit()
+    await publish_calendar_change(db, [dentist_id])
     return {"detail": "Appointment deleted successfully"}
+
+
+@router.post("/dental/appointments/bulk-delete", response_model=BulkDeleteResult, tags=["Appointments"],
+             description="Delete several appointments by ID in one transaction.")
+async def bulk_delete_appointments(bulk: BulkDelete, current_user: UserModel = Depends(get_current_user),
+                                   db: AsyncSession = Depends(get_db)):
+    deleted, not_found, dentist_ids = await delete_by_ids(db, Appointment, bulk.ids, returning=Appointment.dentist_id)
+    if deleted:
+        await publish_calendar_change(db, dentist_ids)
+    return {"deleted": deleted, "not_found": not_found}
@@ -1,60 +1,217 @@
 # src/routes/availability.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
 
-from src.database import get_db
-from src.models import Availability
-from src.schemas import AvailabilityCreate, Availability as AvailabilitySchema
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.crud import delete_by_id, delete_by_ids, update_by_id
+from src.database import get_db, get_read_db
+from src.models import Availability, AvailabilityException, AvailabilityRule
+from src.pagination import NEXT_CURSOR_HEADER, PageParams, paginate
+from src.response_cache import publish_invalidation, response_cache, row_values
+from src.scheduling import calendar_index, first_available, free_slots, mask_weekdays, publish_calendar_change, \
+    weekday_mask
+from src.schemas import AvailabilityCreate, Availability as AvailabilitySchema, BulkDelete, BulkDeleteResult, \
+    DentistSlot, Slot, TreatmentType, AvailabilityRuleCreate, AvailabilityRule as AvailabilityRuleSchema, \
+    AvailabilityExceptionCreate, AvailabilityException as AvailabilityExceptionSchema, Weekday
+from src.utils import naive_utc, parse_timestamps
 
 router = APIRouter()
 
+WEEKDAYS = list(Weekday)
+# One scope for every dentist's pages: an update can move a window between dentists, and
+# availability is written rarely enough that dropping it all is cheap.
+AVAILABILITY_SCOPE = "availability"
+
+
+def rule_response(db_rule: AvailabilityRule) -> dict:
+    return {
+        "id": db_rule.id,
+        "dentist_id": db_rule.dentist_id,
+        "weekdays": [WEEKDAYS[weekday] for weekday in mask_weekdays(db_rule.weekdays)],
+        "start_time": db_rule.start_time,
+        "end_time": db_rule.end_time,
+        "valid_from": db_rule.valid_from,
+        "valid_until": db_rule.valid_until,
+    }
+
 
 @router.post("/", response_model=AvailabilitySchema, tags=["Availability"],
              description="Create availability for a dentist.")
-async def create_availability(availability: AvailabilityCreate, db: Session = Depends(get_db)):
+async def create_availability(availability: AvailabilityCreate, db: AsyncSession = Depends(get_db)):
     try:
+        values = parse_timestamps(availability.dict(), "start_time", "end_time")
         # Validate that start_time is before end_time
-        if availability.start_time >= availability.end_time:
+        if values["start_time"] >= values["end_time"]:
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Start time must be before end time")
 
-        db_availability = Availability(**availability.dict())
+        db_availability = Availability(**values)
         db.add(db_availability)
-        db.commit()
-        db.refresh(db_availability)
+        await db.commit()
+        await db.refresh(db_availability)
+        await publish_calendar_change(db, [db_availability.dentist_id])
+        await publish_invalidation(db, AVAILABILITY_SCOPE)
         return db_availability
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
 
+@router.get("/first-available", response_model=list[DentistSlot], tags=["Availability"],
+            description="Find the earliest free slots for a treatment across all dentists, optionally of one "
+                        "speciality.")
+async def get_first_available(treatment_type: TreatmentType, speciality: Optional[str] = None,
+                              from_time: Optional[datetime] = Query(None, alias="from"),
+                              days: int = Query(14, ge=1, le=90, description="How many days ahead to search"),
+                              limit: int = Query(5, ge=1, le=50), db: AsyncSession = Depends(get_db)):
+    # Index misses load from the primary, as for get_free_slots.
+    from_time = naive_utc(from_time) or datetime.utcnow()
+    slots = await first_available(db, treatment_type.value, from_time, days, limit, speciality)
+    return [{"dentist_id": dentist_id, "start": start, "end": end} for start, dentist_id, end in slots]
+
+
 @router.get("/{dentist_id}", response_model=list[AvailabilitySchema], tags=["Availability"],
-            description="Get availability by dentist ID.")
-async def get_availability(dentist_id: int, db: Session = Depends(get_db)):
-    db_availability = db.query(Availability).filter(Availability.dentist_id == dentist_id).all()
-    if not db_availability:
+            description="Get availability by dentist ID, one page at a time.")
+async def get_availability(dentist_id: int, response: Response, page: PageParams = Depends(),
+                           db: AsyncSession = Depends(get_db)):
+    # Misses load from the primary: a lagging replica could put back rows a write just invalidated, for the whole TTL.
+    async def load():
+        page_response = Response()
+        stmt = select(Availability).filter(Availability.dentist_id == dentist_id)
+        rows = await paginate(db, stmt, Availability, page, page_response)
+        return {"rows": [row_values(row) for row in rows], "next_cursor": page_response.headers.get(NEXT_CURSOR_HEADER)}
+
+    # Empty pages are cached too: the 404 is as cheap to repeat as a hit.
+    cached = await response_cache.get_or_load(AVAILABILITY_SCOPE, f"{dentist_id}:{page.limit}:{page.cursor}", load,
+                                              settings.availability_cache_ttl)
+    if not cached["rows"]:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Availability not found")
-    return db_availability
+    if cached["next_cursor"]:
+        response.headers[NEXT_CURSOR_HEADER] = cached["next_cursor"]
+    return cached["rows"]
+
+
+@router.get("/{dentist_id}/slots", response_model=list[Slot], tags=["Availability"],
+            description="Get a dentist's bookable slots of the given length between two times.")
+async def get_free_slots(dentist_id: int, from_time: datetime = Query(..., alias="from"),
+                         to_time: datetime = Query(..., alias="to"),
+                         duration: int = Query(30, ge=5, le=480, description="Slot length in minutes"),
+                         db: AsyncSession = Depends(get_db)):
+    # Index misses load from the primary: a lagging replica could put back a day a booking just invalidated, and
+    # show the booked slots as free for CALENDAR_INDEX_TTL rather than for the lag.
+    from_time, to_time = naive_utc(from_time), naive_utc(to_time)
+    if from_time >= to_time:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="from must be before to")
+    # Each day in the range is a calendar index entry, so an unbounded range could evict every other dentist's.
+    if to_time - from_time > timedelta(days=settings.max_slots_range_days):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"from and to must be at most {settings.max_slots_range_days} days apart")
+    windows, booked = (await calendar_index.calendars(db, [dentist_id], from_time, to_time))[dentist_id]
+    return [{"start": start, "end": end} for start, end in free_slots(windows, booked, timedelta(minutes=duration))]
 
 
 @router.put("/{availability_id}", response_model=AvailabilitySchema, tags=["Availability"],
             description="Update availability.")
-async def update_availability(availability_id: int, availability: AvailabilityCreate, db: Session = Depends(get_db)):
-    db_availability = db.query(Availability).filter(Availability.id == availability_id).first()
+async def update_availability(availability_id: int, availability: AvailabilityCreate,
+                              db: AsyncSession = Depends(get_db)):
+    try:
+        values = parse_timestamps(availability.dict(), "start_time", "end_time")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    # The window may move to another dentist, so the previous owner's index is dropped too.
+    previous = await db.execute(select(Availability.dentist_id).filter(Availability.id == availability_id)
+                                .with_for_update())
+    previous_dentist = previous.scalar()
+    db_availability = await update_by_id(db, Availability, availability_id, values)
     if not db_availability:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Availability not found")
-    for key, value in availability.dict().items():
-        setattr(db_availability, key, value)
-    db.commit()
-    db.refresh(db_availability)
+    await publish_calendar_change(db, {previous_dentist, db_availability["dentist_id"]} - {None})
+    await publish_invalidation(db, AVAILABILITY_SCOPE)
     return db_availability
 
 
 @router.delete("/{availability_id}", response_model=dict, tags=["Availability"],
                description="Delete availability.")
-async def delete_availability(availability_id: int, db: Session = Depends(get_db)):
-    db_availability = db.query(Availability).filter(Availability.id == availability_id).first()
-    if not db_availability:
+async def delete_availability(availability_id: int, db: AsyncSession = Depends(get_db)):
+    dentist_id = await delete_by_id(db, Availability, availability_id, returning=Availability.dentist_id)
+    if dentist_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Availability not found")
-    db.delete(db_availability)
-    db.commit()
+    await publish_calendar_change(db, [dentist_id])
+    await publish_invalidation(db, AVAILABILITY_SCOPE)
     return {"detail": "Availability deleted successfully"}
+
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult, tags=["Availability"],
+             description="Delete several availability records by ID in one transaction.")
+async def bulk_delete_availability(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found, dentist_ids = await delete_by_ids(db, Availability, bulk.ids,
+                                                          returning=Availability.dentist_id)
+    if deleted:
+        await publish_calendar_change(db, dentist_ids)
+        await publish_invalidation(db, AVAILABILITY_SCOPE)
+    return {"deleted": deleted, "not_found": not_found}
+
+
+@router.post("/rules", response_model=AvailabilityRuleSchema, tags=["Availability"],
+             description="Create a recurring weekly availability rule for a dentist.")
+async def create_availability_rule(rule: AvailabilityRuleCreate, db: AsyncSession = Depends(get_db)):
+    if rule.start_time >= rule.end_time:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Start time must be before end time")
+    if rule.valid_until and rule.valid_until < rule.valid_from:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="valid_until must not be before valid_from")
+    weekdays = weekday_mask(WEEKDAYS.index(day) for day in rule.weekdays)
+    db_rule = AvailabilityRule(**{**rule.dict(), "weekdays": weekdays})
+    db.add(db_rule)
+    await db.commit()
+    await publish_calendar_change(db, [db_rule.dentist_id])
+    return rule_response(db_rule)
+
+
+@router.get("/rules/{dentist_id}", response_model=list[AvailabilityRuleSchema], tags=["Availability"],
+            description="Get a dentist's recurring availability rules.")
+async def get_availability_rules(dentist_id: int, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(AvailabilityRule).filter(AvailabilityRule.dentist_id == dentist_id)
+                              .order_by(AvailabilityRule.id))
+    return [rule_response(db_rule) for db_rule in result.scalars()]
+
+
+@router.delete("/rules/{rule_id}", response_model=dict, tags=["Availability"],
+               description="Delete a recurring availability rule.")
+async def delete_availability_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
+    dentist_id = await delete_by_id(db, AvailabilityRule, rule_id, returning=AvailabilityRule.dentist_id)
+    if dentist_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Availability rule not found")
+    await publish_calendar_change(db, [dentist_id])
+    return {"detail": "Availability rule deleted successfully"}
+
+
+@router.post("/exceptions", response_model=AvailabilityExceptionSchema, tags=["Availability"],
+             description="Block a date, or part of it, out of a dentist's recurring availability.")
+async def create_availability_exception(exception: AvailabilityExceptionCreate, db: AsyncSession = Depends(get_db)):
+    if (exception.start_time is None) != (exception.end_time is None):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Give both start_time and end_time, or neither to block the whole day")
+    if exception.start_time is not None and exception.start_time >= exception.end_time:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Start time must be before end time")
+    db_exception = AvailabilityException(**exception.dict())
+    db.add(db_exception)
+    await db.commit()
+    await publish_calendar_change(db, [db_exception.dentist_id])
+    return db_exception
+
+
+@router.delete("/exceptions/{exception_id}", response_model=dict, tags=["Availability"],
+               description="Delete an availability exception.")
+async def delete_availability_exception(exception_id: int, db: AsyncSession = Depends(get_db)):
+    dentist_id = await delete_by_id(db, AvailabilityException, exception_id,
+                                    returning=AvailabilityException.dentist_id)
+    if dentist_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Availability exception not found")
+    await publish_calendar_change(db, [dentist_id])
+    return {"detail": "Availability exception deleted successfully"}
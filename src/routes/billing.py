@@ -1,46 +1,71 @@
 # src/routes/billing.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import date
+from typing import Optional
 
-from src.database import get_db
-from src.models import Billing
-from src.schemas import BillingCreate, Billing as BillingSchema
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth import get_current_user
+from src.conditional import update_if_match
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
+from src.export import billing_export_query, export_response
+from src.fieldsets import load_fields, sparse_fields
+from src.models import Billing, User as UserModel
+from src.pagination import PageParams, paginate
+from src.serialization import list_response
+from src.schemas import BillingCreate, Billing as BillingSchema, BulkDelete, BulkDeleteResult, FileFormat
 
 router = APIRouter()
 
 @router.post("/", response_model=BillingSchema, tags=["Billing"], description="Create a billing record.")
-async def create_billing(billing: BillingCreate, db: Session = Depends(get_db)):
+async def create_billing(billing: BillingCreate, db: AsyncSession = Depends(get_db)):
     db_billing = Billing(**billing.dict())
     db.add(db_billing)
-    db.commit()
-    db.refresh(db_billing)
+    await db.commit()
+    await db.refresh(db_billing)
     return db_billing
 
 @router.get("/patient/{patient_id}", response_model=list[BillingSchema], tags=["Billing"],
-            description="Get billing records by patient ID.")
-async def get_billing_by_patient(patient_id: int, db: Session = Depends(get_db)):
-    db_billing = db.query(Billing).filter(Billing.patient_id == patient_id).all()
+            description="Get billing records by patient ID, one page at a time.")
+async def get_billing_by_patient(patient_id: int, response: Response, page: PageParams = Depends(),
+                                 fields: Optional[list] = Depends(sparse_fields(BillingSchema)),
+                                 db: AsyncSession = Depends(get_read_db)):
+    stmt = select(Billing).filter(Billing.patient_id == patient_id).options(*load_fields(Billing, fields))
+    db_billing = await paginate(db, stmt, Billing, page, response)
     if not db_billing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billing records not found")
-    return db_billing
+    return list_response(db_billing, BillingSchema, response, fields)
+
+@router.get("/export", tags=["Billing"],
+            description="Stream every billing record as CSV or NDJSON, optionally filtered by creation date and the "
+                        "appointment's dentist.")
+async def export_billing(format: FileFormat = FileFormat.ndjson, from_date: Optional[date] = Query(None, alias="from"),
+                         to_date: Optional[date] = Query(None, alias="to"), dentist_id: Optional[int] = None,
+                         current_user: UserModel = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    stmt = billing_export_query(from_date, to_date, dentist_id)
+    return export_response(db, stmt, format.value, "billing")
+
 
 @router.put("/{billing_id}", response_model=BillingSchema, tags=["Billing"],
             description="Update a billing record.")
-async def update_billing(billing_id: int, billing: BillingCreate, db: Session = Depends(get_db)):
-    db_billing = db.query(Billing).filter(Billing.id == billing_id).first()
+async def update_billing(billing_id: int, billing: BillingCreate, request: Request, response: Response,
+                         db: AsyncSession = Depends(get_db)):
+    db_billing = await update_if_match(db, Billing, billing_id, billing.dict(), request, response)
     if not db_billing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billing record not found")
-    for key, value in billing.dict().items():
-        setattr(db_billing, key, value)
-    db.commit()
-    db.refresh(db_billing)
     return db_billing
 
 @router.delete("/{billing_id}", response_model=dict, tags=["Billing"], description="Delete a billing record.")
-async def delete_billing(billing_id: int, db: Session = Depends(get_db)):
-    db_billing = db.query(Billing).filter(Billing.id == billing_id).first()
-    if not db_billing:
+async def delete_billing(billing_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Billing, billing_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Billing record not found")
-    db.delete(db_billing)
-    db.commit()
-    return {"detail": "Billing record deleted successfully"}
\ No newline at end of file
+    return {"detail": "Billing record deleted successfully"}
+
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult, tags=["Billing"],
+             description="Delete several billing records by ID in one transaction.")
+async def bulk_delete_billing(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Billing, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
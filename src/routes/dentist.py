@@ -1,48 +1,85 @@
 # src/routes/dentist.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime
 
-from src.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conditional import is_fresh, update_if_match, version_headers
+from src.config import settings
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
+from src.includes import DENTIST_INCLUDES, include_param, included, load_includes
 from src.models import Dentist
-from src.schemas import DentistCreate, Dentist as DentistSchema
+from src.response_cache import publish_invalidation, response_cache, row_values
+from src.schemas import DentistCreate, Dentist as DentistSchema, BulkDelete, BulkDeleteResult
+from src.serialization import item_response
 
 router = APIRouter()
 
 
 @router.post("/dentists", response_model=DentistSchema, tags=["Dentists"], description="Create a new dentist.")
-async def create_dentist(dentist: DentistCreate, db: Session = Depends(get_db)):
+async def create_dentist(dentist: DentistCreate, db: AsyncSession = Depends(get_db)):
     db_dentist = Dentist(**dentist.dict())
     db.add(db_dentist)
-    db.commit()
-    db.refresh(db_dentist)
+    await db.commit()
+    await db.refresh(db_dentist)
     return db_dentist
 
 
-@router.get("/dentists/{dentist_id}", response_model=DentistSchema, tags=["Dentists"], description="Get a dentist by ID.")
-async def get_dentist(dentist_id: int, db: Session = Depends(get_db)):
-    db_dentist = db.query(Dentist).filter(Dentist.id == dentist_id).first()
+@router.get("/dentists/{dentist_id}", response_model=DentistSchema, tags=["Dentists"],
+            description="Get a dentist by ID, optionally with their appointments and reports.")
+async def get_dentist(dentist_id: int, request: Request, response: Response,
+                      include: list = Depends(include_param(DENTIST_INCLUDES)),
+                      db: AsyncSession = Depends(get_read_db), primary: AsyncSession = Depends(get_db)):
+    if include:
+        # Compound documents skip the cache, which the related collections' writers don't invalidate.
+        result = await db.execute(select(Dentist).filter(Dentist.id == dentist_id)
+                                  .options(*load_includes(DENTIST_INCLUDES, include)))
+        db_dentist = result.scalars().first()
+        if not db_dentist:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dentist not found")
+        return item_response(db_dentist, DentistSchema, related=included(db_dentist, DENTIST_INCLUDES, include))
+
+    async def load():
+        # From the primary: a lagging replica could put back the row a write just invalidated, for the whole TTL.
+        result = await primary.execute(select(Dentist).filter(Dentist.id == dentist_id))
+        db_dentist = result.scalars().first()
+        return row_values(db_dentist) if db_dentist else None
+
+    db_dentist = await response_cache.get_or_load(f"dentist:{dentist_id}", "", load, settings.dentist_cache_ttl)
     if not db_dentist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dentist not found")
+    if db_dentist["updated_at"]:
+        # The cached copy carries its version, so a conditional GET needs no query at all.
+        updated_at = datetime.fromisoformat(db_dentist["updated_at"])
+        if is_fresh(request, updated_at):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=version_headers(updated_at))
+        response.headers.update(version_headers(updated_at))
     return db_dentist
 
 
 @router.put("/dentists/{dentist_id}", response_model=DentistSchema, tags=["Dentists"], description="Update a dentist's information.")
-async def update_dentist(dentist_id: int, dentist: DentistCreate, db: Session = Depends(get_db)):
-    db_dentist = db.query(Dentist).filter(Dentist.id == dentist_id).first()
+async def update_dentist(dentist_id: int, dentist: DentistCreate, request: Request, response: Response,
+                         db: AsyncSession = Depends(get_db)):
+    db_dentist = await update_if_match(db, Dentist, dentist_id, dentist.dict(), request, response)
     if not db_dentist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dentist not found")
-    for key, value in dentist.dict().items():
-        setattr(db_dentist, key, value)
-    db.commit()
-    db.refresh(db_dentist)
+    await publish_invalidation(db, f"dentist:{dentist_id}")
     return db_dentist
 
 
 @router.delete("/dentists/{dentist_id}", response_model=dict, tags=["Dentists"], description="Delete a dentist.")
-async def delete_dentist(dentist_id: int, db: Session = Depends(get_db)):
-    db_dentist = db.query(Dentist).filter(Dentist.id == dentist_id).first()
-    if not db_dentist:
+async def delete_dentist(dentist_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Dentist, dentist_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dentist not found")
-    db.delete(db_dentist)
-    db.commit()
-    return {"detail": "Dentist deleted successfully"}
\ No newline at end of file
+    await publish_invalidation(db, f"dentist:{dentist_id}")
+    return {"detail": "Dentist deleted successfully"}
+
+
+@router.post("/dentists/bulk-delete", response_model=BulkDeleteResult, tags=["Dentists"],
+             description="Delete several dentists by ID in one transaction.")
+async def bulk_delete_dentists(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Dentist, bulk.ids)
+    await publish_invalidation(db, *(f"dentist:{dentist_id}" for dentist_id in deleted))
+    return {"deleted": deleted, "not_found": not_found}
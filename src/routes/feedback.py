@@ -1,56 +1,68 @@
 # src/routes/feedback.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db
+from src.conditional import not_modified, set_version_headers, update_if_match
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
 from src.models import Feedback
-from src.schemas import FeedbackCreate, Feedback as FeedbackSchema
+from src.pagination import PageParams, paginate
+from src.serialization import list_response
+from src.schemas import FeedbackCreate, Feedback as FeedbackSchema, BulkDelete, BulkDeleteResult
 
 router = APIRouter()
 
 
 @router.post("/", response_model=FeedbackSchema, tags=["Feedback"], description="Create feedback for an appointment.")
-async def create_feedback(feedback: FeedbackCreate, db: Session = Depends(get_db)):
+async def create_feedback(feedback: FeedbackCreate, db: AsyncSession = Depends(get_db)):
     db_feedback = Feedback(**feedback.dict())
     db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
+    await db.commit()
+    await db.refresh(db_feedback)
     return db_feedback
 
 
 @router.get("/{feedback_id}", response_model=FeedbackSchema, tags=["Feedback"], description="Get feedback by ID.")
-async def get_feedback(feedback_id: int, db: Session = Depends(get_db)):
-    db_feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+async def get_feedback(feedback_id: int, request: Request, response: Response,
+                       db: AsyncSession = Depends(get_read_db)):
+    if cached := await not_modified(db, Feedback, feedback_id, request):
+        return cached
+    result = await db.execute(select(Feedback).filter(Feedback.id == feedback_id))
+    db_feedback = result.scalars().first()
     if not db_feedback:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Feedback not found")
+    set_version_headers(response, db_feedback.updated_at)
     return db_feedback
 
 
-@router.get("/", response_model=list[FeedbackSchema], tags=["Feedback"], description="Get all feedback.")
-async def get_all_feedback(db: Session = Depends(get_db)):
-    feedbacks = db.query(Feedback).all()
+@router.get("/", response_model=list[FeedbackSchema], tags=["Feedback"],
+            description="Get all feedback, one page at a time.")
+async def get_all_feedback(response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_read_db)):
+    feedbacks = await paginate(db, select(Feedback), Feedback, page, response)
     if not feedbacks:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No feedback found")
-    return feedbacks
+    return list_response(feedbacks, FeedbackSchema, response)
 
 
 @router.put("/{feedback_id}", response_model=FeedbackSchema, tags=["Feedback"], description="Update feedback.")
-async def update_feedback(feedback_id: int, feedback: FeedbackCreate, db: Session = Depends(get_db)):
-    db_feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
+async def update_feedback(feedback_id: int, feedback: FeedbackCreate, request: Request, response: Response,
+                          db: AsyncSession = Depends(get_db)):
+    db_feedback = await update_if_match(db, Feedback, feedback_id, feedback.dict(), request, response)
     if not db_feedback:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Feedback not found")
-    for key, value in feedback.dict().items():
-        setattr(db_feedback, key, value)
-    db.commit()
-    db.refresh(db_feedback)
     return db_feedback
 
 
 @router.delete("/{feedback_id}", response_model=dict, tags=["Feedback"], description="Delete feedback.")
-async def delete_feedback(feedback_id: int, db: Session = Depends(get_db)):
-    db_feedback = db.query(Feedback).filter(Feedback.id == feedback_id).first()
-    if not db_feedback:
+async def delete_feedback(feedback_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Feedback, feedback_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Feedback not found")
-    db.delete(db_feedback)
-    db.commit()
     return {"detail": "Feedback deleted successfully"}
+
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult, tags=["Feedback"],
+             description="Delete several feedback entries by ID in one transaction.")
+async def bulk_delete_feedback(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Feedback, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
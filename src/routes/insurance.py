@@ -1,47 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db
+from src.conditional import not_modified, set_version_headers, update_if_match
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
 from src.models import Insurance
-from src.schemas import InsuranceCreate, Insurance as InsuranceSchema
+from src.schemas import InsuranceCreate, Insurance as InsuranceSchema, BulkDelete, BulkDeleteResult
 
 router = APIRouter()
 
 
 @router.post("/insurances", response_model=InsuranceSchema, tags=["Insurance"], description="Create a new insurance record.")
-async def create_insurance(insurance: InsuranceCreate, db: Session = Depends(get_db)):
+async def create_insurance(insurance: InsuranceCreate, db: AsyncSession = Depends(get_db)):
     db_insurance = Insurance(**insurance.dict())
     db.add(db_insurance)
-    db.commit()
-    db.refresh(db_insurance)
+    await db.commit()
+    await db.refresh(db_insurance)
     return db_insurance
 
 
 @router.get("/insurances/{insurance_id}", response_model=InsuranceSchema, tags=["Insurance"], description="Get an insurance record by ID.")
-async def get_insurance(insurance_id: int, db: Session = Depends(get_db)):
-    db_insurance = db.query(Insurance).filter(Insurance.id == insurance_id).first()
+async def get_insurance(insurance_id: int, request: Request, response: Response,
+                        db: AsyncSession = Depends(get_read_db)):
+    if cached := await not_modified(db, Insurance, insurance_id, request):
+        return cached
+    result = await db.execute(select(Insurance).filter(Insurance.id == insurance_id))
+    db_insurance = result.scalars().first()
     if not db_insurance:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Insurance record not found")
+    set_version_headers(response, db_insurance.updated_at)
     return db_insurance
 
 
 @router.put("/insurances/{insurance_id}", response_model=InsuranceSchema, tags=["Insurance"], description="Update an insurance record.")
-async def update_insurance(insurance_id: int, insurance: InsuranceCreate, db: Session = Depends(get_db)):
-    db_insurance = db.query(Insurance).filter(Insurance.id == insurance_id).first()
+async def update_insurance(insurance_id: int, insurance: InsuranceCreate, request: Request, response: Response,
+                           db: AsyncSession = Depends(get_db)):
+    db_insurance = await update_if_match(db, Insurance, insurance_id, insurance.dict(), request, response)
     if not db_insurance:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Insurance record not found")
-    for key, value in insurance.dict().items():
-        setattr(db_insurance, key, value)
-    db.commit()
-    db.refresh(db_insurance)
     return db_insurance
 
 
 @router.delete("/insurances/{insurance_id}", response_model=dict, tags=["Insurance"], description="Delete an insurance record.")
-async def delete_insurance(insurance_id: int, db: Session = Depends(get_db)):
-    db_insurance = db.query(Insurance).filter(Insurance.id == insurance_id).first()
-    if not db_insurance:
+async def delete_insurance(insurance_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Insurance, insurance_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Insurance record not found")
-    db.delete(db_insurance)
-    db.commit()
-    return {"detail": "Insurance record deleted successfully"}
\ No newline at end of file
+    return {"detail": "Insurance record deleted successfully"}
+
+
+@router.post("/insurances/bulk-delete", response_model=BulkDeleteResult, tags=["Insurance"],
+             description="Delete several insurance records by ID in one transaction.")
+async def bulk_delete_insurances(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Insurance, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
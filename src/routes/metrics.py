@@ -0,0 +1,46 @@
+# src/routes/metrics.py
+from fastapi import APIRouter
+
+from src.auth import principal_cache
+from src.database import pool_metrics, replica_pool_metrics
+from src.hashing import hashing_executor
+from src.response_cache import response_cache
+from src.scheduling import calendar_index
+
+router = APIRouter()
+
+
+@router.get("/hashing", response_model=dict, tags=["Metrics"],
+            description="Queue depth, wait times and rejections of the password hashing pool.")
+async def get_hashing_metrics():
+    return hashing_executor.stats()
+
+
+@router.get("/principal-cache", response_model=dict, tags=["Metrics"],
+            description="Hit/miss counters of the authenticated principal cache.")
+async def get_principal_cache_metrics():
+    return principal_cache.stats()
+
+
+@router.get("/pool", response_model=dict, tags=["Metrics"],
+            description="Checkout latency histogram and in-use/idle counts of the database connection pool.")
+async def get_pool_metrics():
+    return pool_metrics.stats()
+
+
+@router.get("/replica-pool", response_model=dict, tags=["Metrics"],
+            description="The same pool metrics for the read replica; empty when no replica is configured.")
+async def get_replica_pool_metrics():
+    return replica_pool_metrics.stats() if replica_pool_metrics.engine else {}
+
+
+@router.get("/calendar-index", response_model=dict, tags=["Metrics"],
+            description="Hit/miss counters of the per-dentist calendar index.")
+async def get_calendar_index_metrics():
+    return calendar_index.stats()
+
+
+@router.get("/response-cache", response_model=dict, tags=["Metrics"],
+            description="Hit/miss and single-flight counters of the dentist and availability response cache.")
+async def get_response_cache_metrics():
+    return response_cache.stats()
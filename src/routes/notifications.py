@@ -1,47 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db
+from src.conditional import not_modified, set_version_headers, update_if_match
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
 from src.models import Notification
-from src.schemas import NotificationCreate, Notification as NotificationSchema
+from src.schemas import NotificationCreate, Notification as NotificationSchema, BulkDelete, BulkDeleteResult
 
 router = APIRouter()
 
 
 @router.post("/notifications", response_model=NotificationSchema, tags=["Notifications"], description="Create a new notification.")
-async def create_notification(notification: NotificationCreate, db: Session = Depends(get_db)):
+async def create_notification(notification: NotificationCreate, db: AsyncSession = Depends(get_db)):
     db_notification = Notification(**notification.dict())
     db.add(db_notification)
-    db.commit()
-    db.refresh(db_notification)
+    await db.commit()
+    await db.refresh(db_notification)
     return db_notification
 
 
 @router.get("/notifications/{notification_id}", response_model=NotificationSchema, tags=["Notifications"], description="Get a notification by ID.")
-async def get_notification(notification_id: int, db: Session = Depends(get_db)):
-    db_notification = db.query(Notification).filter(Notification.id == notification_id).first()
+async def get_notification(notification_id: int, request: Request, response: Response,
+                           db: AsyncSession = Depends(get_read_db)):
+    if cached := await not_modified(db, Notification, notification_id, request):
+        return cached
+    result = await db.execute(select(Notification).filter(Notification.id == notification_id))
+    db_notification = result.scalars().first()
     if not db_notification:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found")
+    set_version_headers(response, db_notification.updated_at)
     return db_notification
 
 
 @router.put("/notifications/{notification_id}", response_model=NotificationSchema, tags=["Notifications"], description="Update a notification.")
-async def update_notification(notification_id: int, notification: NotificationCreate, db: Session = Depends(get_db)):
-    db_notification = db.query(Notification).filter(Notification.id == notification_id).first()
+async def update_notification(notification_id: int, notification: NotificationCreate, request: Request,
+                              response: Response, db: AsyncSession = Depends(get_db)):
+    db_notification = await update_if_match(db, Notification, notification_id, notification.dict(), request,
+                                            response)
     if not db_notification:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found")
-    for key, value in notification.dict().items():
-        setattr(db_notification, key, value)
-    db.commit()
-    db.refresh(db_notification)
     return db_notification
 
 
 @router.delete("/notifications/{notification_id}", response_model=dict, tags=["Notifications"], description="Delete a notification.")
-async def delete_notification(notification_id: int, db: Session = Depends(get_db)):
-    db_notification = db.query(Notification).filter(Notification.id == notification_id).first()
-    if not db_notification:
+async def delete_notification(notification_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Notification, notification_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found")
-    db.delete(db_notification)
-    db.commit()
-    return {"detail": "Notification deleted successfully"}
\ No newline at end of file
+    return {"detail": "Notification deleted successfully"}
+
+
+@router.post("/notifications/bulk-delete", response_model=BulkDeleteResult, tags=["Notifications"],
+             description="Delete several notifications by ID in one transaction.")
+async def bulk_delete_notifications(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Notification, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
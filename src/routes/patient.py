@@ -1,48 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
 
-from src.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conditional import not_modified, set_version_headers, update_if_match
+from src.config import settings
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
+from src.fieldsets import load_fields, sparse_fields
+from src.includes import PATIENT_INCLUDES, include_param, included, load_includes
 from src.models import Patient
-from src.schemas import PatientCreate, Patient as PatientSchema
+from src.patient_import import import_patients
+from src.serialization import item_response
+from src.utils import parse_timestamps
+from src.schemas import PatientCreate, Patient as PatientSchema, BulkDelete, BulkDeleteResult, FileFormat, \
+    PatientImportResult
 
 router = APIRouter()
 
 
 @router.post("/patients", response_model=PatientSchema, tags=["Patients"], description="Create a new patient.")
-async def create_patient(patient: PatientCreate, db: Session = Depends(get_db)):
+async def create_patient(patient: PatientCreate, db: AsyncSession = Depends(get_db)):
     db_patient = Patient(first_name=patient.first_name, last_name=patient.last_name, email=patient.email)
     db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
+    await db.commit()
+    await db.refresh(db_patient)
     return db_patient
 
 
+@router.post("/patients/import", response_model=PatientImportResult, tags=["Patients"],
+             description="Import patients from a CSV or NDJSON request body, streamed in chunks.")
+async def import_patients_route(request: Request, format: FileFormat = FileFormat.csv,
+                                db: AsyncSession = Depends(get_db)):
+    errors = []
+
+    def collect(error: dict):
+        # The counts cover every rejected row; listing them all would hold a bad upload in memory.
+        if len(errors) < settings.import_error_limit:
+            errors.append(error)
+
+    summary = await import_patients(db, request.stream(), format.value, on_error=collect)
+    rejected = summary["duplicates"] + summary["invalid"]
+    return {**summary, "errors": errors, "errors_truncated": rejected > len(errors)}
+
+
 @router.get("/patients/{patient_id}", response_model=PatientSchema, tags=["Patients"],
-            description="Get a patient by ID.")
-async def get_patient(patient_id: int, db: Session = Depends(get_db)):
-    db_patient = db.query(Patient).filter(Patient.id == patient_id).first()
+            description="Get a patient by ID, optionally with their appointments, billing, insurance and reports.")
+async def get_patient(patient_id: int, request: Request, response: Response,
+                      fields: Optional[list] = Depends(sparse_fields(PatientSchema)),
+                      include: list = Depends(include_param(PATIENT_INCLUDES)),
+                      db: AsyncSession = Depends(get_read_db)):
+    # The patient's version doesn't cover the embedded collections, so compound documents aren't conditional.
+    if not include and (cached := await not_modified(db, Patient, patient_id, request)):
+        return cached
+    result = await db.execute(select(Patient).filter(Patient.id == patient_id)
+                              .options(*load_fields(Patient, fields, Patient.updated_at),
+                                       *load_includes(PATIENT_INCLUDES, include)))
+    db_patient = result.scalars().first()
     if not db_patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    return db_patient
+    if not include:
+        set_version_headers(response, db_patient.updated_at)
+    return item_response(db_patient, PatientSchema, response, fields, included(db_patient, PATIENT_INCLUDES, include))
 
 
 @router.put("/patients/{patient_id}", response_model=PatientSchema, tags=["Patients"], description="Update a patient.")
-async def update_patient(patient_id: int, patient: PatientCreate, db: Session = Depends(get_db)):
-    db_patient = db.query(Patient).filter(Patient.id == patient_id).first()
+async def update_patient(patient_id: int, patient: PatientCreate, request: Request, response: Response,
+                         db: AsyncSession = Depends(get_db)):
+    try:
+        values = parse_timestamps(patient.dict(), "date_of_birth")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    db_patient = await update_if_match(db, Patient, patient_id, values, request, response)
     if not db_patient:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    for key, value in patient.dict().items():
-        setattr(db_patient, key, value)
-    db.commit()
-    db.refresh(db_patient)
     return db_patient
 
 
 @router.delete("/patients/{patient_id}", response_model=dict, tags=["Patients"], description="Delete a patient.")
-async def delete_patient(patient_id: int, db: Session = Depends(get_db)):
-    db_patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not db_patient:
+async def delete_patient(patient_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Patient, patient_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found")
-    db.delete(db_patient)
-    db.commit()
     return {"detail": "Patient deleted successfully"}
+
+
+@router.post("/patients/bulk-delete", response_model=BulkDeleteResult, tags=["Patients"],
+             description="Delete several patients by ID in one transaction.")
+async def bulk_delete_patients(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Patient, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
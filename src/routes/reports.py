@@ -1,47 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database import get_db
+from src.conditional import not_modified, set_version_headers, update_if_match
+from src.crud import delete_by_id, delete_by_ids
+from src.database import get_db, get_read_db
 from src.models import Report
-from src.schemas import ReportCreate, Report as ReportSchema
+from src.schemas import ReportCreate, Report as ReportSchema, BulkDelete, BulkDeleteResult
 
 router = APIRouter()
 
 
 @router.post("/reports", response_model=ReportSchema, tags=["Reports"], description="Create a new report.")
-async def create_report(report: ReportCreate, db: Session = Depends(get_db)):
+async def create_report(report: ReportCreate, db: AsyncSession = Depends(get_db)):
     db_report = Report(**report.dict())
     db.add(db_report)
-    db.commit()
-    db.refresh(db_report)
+    await db.commit()
+    await db.refresh(db_report)
     return db_report
 
 
 @router.get("/reports/{report_id}", response_model=ReportSchema, tags=["Reports"], description="Get a report by ID.")
-async def get_report(report_id: int, db: Session = Depends(get_db)):
-    db_report = db.query(Report).filter(Report.id == report_id).first()
+async def get_report(report_id: int, request: Request, response: Response,
+                     db: AsyncSession = Depends(get_read_db)):
+    if cached := await not_modified(db, Report, report_id, request):
+        return cached
+    result = await db.execute(select(Report).filter(Report.id == report_id))
+    db_report = result.scalars().first()
     if not db_report:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report not found")
+    set_version_headers(response, db_report.updated_at)
     return db_report
 
 
 @router.put("/reports/{report_id}", response_model=ReportSchema, tags=["Reports"], description="Update a report.")
-async def update_report(report_id: int, report: ReportCreate, db: Session = Depends(get_db)):
-    db_report = db.query(Report).filter(Report.id == report_id).first()
+async def update_report(report_id: int, report: ReportCreate, request: Request, response: Response,
+                        db: AsyncSession = Depends(get_db)):
+    db_report = await update_if_match(db, Report, report_id, report.dict(), request, response)
     if not db_report:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report not found")
-    for key, value in report.dict().items():
-        setattr(db_report, key, value)
-    db.commit()
-    db.refresh(db_report)
     return db_report
 
 
 @router.delete("/reports/{report_id}", response_model=dict, tags=["Reports"], description="Delete a report.")
-async def delete_report(report_id: int, db: Session = Depends(get_db)):
-    db_report = db.query(Report).filter(Report.id == report_id).first()
-    if not db_report:
+async def delete_report(report_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, Report, report_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Report not found")
-    db.delete(db_report)
-    db.commit()
-    return {"detail": "Report deleted successfully"}
\ No newline at end of file
+    return {"detail": "Report deleted successfully"}
+
+
+@router.post("/reports/bulk-delete", response_model=BulkDeleteResult, tags=["Reports"],
+             description="Delete several reports by ID in one transaction.")
+async def bulk_delete_reports(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, Report, bulk.ids)
+    return {"deleted": deleted, "not_found": not_found}
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.auth import get_current_user
-from src.database import get_db
+from src.auth import get_current_user, invalidate_principal
+from src.crud import delete_by_id, delete_by_ids, update_by_id
+from src.database import get_db, get_read_db
+from src.hashing import hashing_executor
 from src.models import User as UserModel
-from src.schemas import User, UserCreate
+from src.revocation import revoke_tokens
+from src.schemas import User, UserCreate, BulkDelete, BulkDeleteResult
+from src.utils import hash_password
 
 router = APIRouter()
 
@@ -15,30 +20,44 @@ async def get_current_user_info(current_user: UserModel = Depends(get_current_us
 
 
 @router.get("/{user_id}", response_model=User, tags=["User"], description="Get a user by ID.")
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(UserModel).filter(UserModel.id == user_id))
+    db_user = result.scalars().first()
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return db_user
 
 
 @router.put("/{user_id}", response_model=User, tags=["User"], description="Update a user's information.")
-async def update_user(user_id: int, user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+async def update_user(user_id: int, user: UserCreate, db: AsyncSession = Depends(get_db)):
+    values = user.dict()
+    values["hashed_password"] = await hashing_executor.run(hash_password, values.pop("password"))
+    db_user = await update_by_id(db, UserModel, user_id, values, commit=False)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    for key, value in user.dict().items():
-        setattr(db_user, key, value)
-    db.commit()
-    db.refresh(db_user)
+    await revoke_tokens(db, user_id)
+    await db.commit()
+    invalidate_principal(user_id)
     return db_user
 
 
 @router.delete("/{user_id}", response_model=dict, tags=["User"], description="Delete a user.")
-async def delete_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
-    if not db_user:
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    if not await delete_by_id(db, UserModel, user_id, commit=False):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    db.delete(db_user)
-    db.commit()
+    await revoke_tokens(db, user_id)
+    await db.commit()
+    invalidate_principal(user_id)
     return {"detail": "User deleted successfully"}
+
+
+@router.post("/bulk-delete", response_model=BulkDeleteResult, tags=["User"],
+             description="Delete several users by ID in one transaction.")
+async def bulk_delete_users(bulk: BulkDelete, db: AsyncSession = Depends(get_db)):
+    deleted, not_found = await delete_by_ids(db, UserModel, bulk.ids, commit=False)
+    if deleted:
+        await revoke_tokens(db, *deleted)
+    await db.commit()
+    for user_id in deleted:
+        invalidate_principal(user_id)
+    return {"deleted": deleted, "not_found": not_found}
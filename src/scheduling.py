@@ -0,0 +1,332 @@
+# src/scheduling.py
+"""Free-slot arithmetic over availability windows and booked appointments.
+
+Intervals are half-open ``(start, end)`` datetime pairs. Everything here is a generator over
+sorted intervals, so callers only pay for the slots they actually consume.
+"""
+import heapq
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import LRUCache
+from src.config import settings
+from src.constants import DEFAULT_TREATMENT_DURATION, TREATMENT_DURATIONS
+from src.database import engine
+from src.models import Appointment, Availability, AvailabilityException, AvailabilityRule, Dentist
+
+CALENDAR_CHANNEL = "calendar_changes"
+# No appointment starts further back than this and still overlaps a range, which bounds the
+# (dentist_id, starts_at) index scan an overlap query needs.
+LONGEST_TREATMENT = timedelta(minutes=max(TREATMENT_DURATIONS.values()))
+
+
+def treatment_duration(treatment_type) -> timedelta:
+    return timedelta(minutes=TREATMENT_DURATIONS.get(getattr(treatment_type, "value", treatment_type),
+                                                     DEFAULT_TREATMENT_DURATION))
+
+
+def appointment_interval(appointment_date: date, appointment_time, treatment_type):
+    start = datetime.combine(appointment_date, appointment_time)
+    return start, start + treatment_duration(treatment_type)
+
+
+def overlapping(stmt, start: datetime, end: datetime):
+    """Restrict an appointments query to the appointments overlapping ``[start, end)``."""
+    return stmt.filter(Appointment.starts_at > start - LONGEST_TREATMENT, Appointment.starts_at < end,
+                       Appointment.ends_at > start)
+
+
+def merge_intervals(intervals):
+    """Coalesce overlapping or touching intervals; ``intervals`` must be sorted by start."""
+    current = None
+    for start, end in intervals:
+        if current and start <= current[1]:
+            current = (current[0], max(current[1], end))
+            continue
+        if current:
+            yield current
+        current = (start, end)
+    if current:
+        yield current
+
+
+def free_intervals(windows, booked):
+    """Subtract ``booked`` from ``windows`` in a single pass; both must be sorted by start."""
+    booked = list(merge_intervals(booked))
+    i = 0
+    for start, end in merge_intervals(windows):
+        while i < len(booked) and booked[i][1] <= start:
+            i += 1
+        cursor, j = start, i
+        while j < len(booked) and booked[j][0] < end:
+            if booked[j][0] > cursor:
+                yield cursor, booked[j][0]
+            cursor = max(cursor, booked[j][1])
+            j += 1
+        if cursor < end:
+            yield cursor, end
+        # The last booking seen may run on into the next window.
+        i = max(i, j - 1)
+
+
+def free_slots(windows, booked, duration: timedelta):
+    """Yield back-to-back ``duration``-long slots from each free interval, earliest first."""
+    for start, end in free_intervals(sorted(windows), sorted(booked)):
+        while start + duration <= end:
+            yield start, start + duration
+            start += duration
+
+
+def weekday_mask(weekdays) -> int:
+    """Pack day indexes (0 = Monday, as ``date.weekday()``) into a rule's weekday bitmask."""
+    mask = 0
+    for weekday in weekdays:
+        mask |= 1 << weekday
+    return mask
+
+
+def mask_weekdays(mask: int) -> list:
+    return [weekday for weekday in range(7) if mask & (1 << weekday)]
+
+
+def expand_rules(rules, start: datetime, end: datetime):
+    """Yield the concrete windows of recurring ``rules`` that overlap ``[start, end)``, day by day.
+
+    ``rules`` are ``(weekdays, start_time, end_time, valid_from, valid_until)`` tuples. Whether a rule
+    applies on a day is one bitmask test, so nothing is stored per occurrence.
+    """
+    day, last = start.date(), (end - timedelta.resolution).date()
+    while day <= last:
+        bit = 1 << day.weekday()
+        for weekdays, start_time, end_time, valid_from, valid_until in rules:
+            if weekdays & bit and valid_from <= day and (valid_until is None or day <= valid_until):
+                window_start, window_end = datetime.combine(day, start_time), datetime.combine(day, end_time)
+                if window_start < end and window_end > start:
+                    yield max(window_start, start), min(window_end, end)
+        day += timedelta(days=1)
+
+
+def exception_interval(day: date, start_time, end_time):
+    if start_time is None or end_time is None:
+        return datetime.combine(day, time.min), datetime.combine(day + timedelta(days=1), time.min)
+    return datetime.combine(day, start_time), datetime.combine(day, end_time)
+
+
+async def load_calendars(db: AsyncSession, dentist_ids, start: datetime, end: datetime) -> dict:
+    """Fetch availability windows and booked intervals overlapping ``[start, end)`` for ``dentist_ids``.
+
+    Windows are the one-off ``Availability`` rows plus each recurring rule expanded over the range,
+    less the dentist's dated exceptions to those rules. Returns ``{dentist_id: (windows, booked)}``
+    with windows clipped to the range, using one query for each table whatever the number of dentists.
+    """
+    bookings = await load_bookings(db, dentist_ids, start, end)
+    calendars = {dentist_id: ([], bookings[dentist_id]) for dentist_id in dentist_ids}
+    windows = await db.execute(
+        select(Availability.dentist_id, Availability.start_time, Availability.end_time).filter(
+            Availability.dentist_id.in_(calendars), Availability.start_time < end, Availability.end_time > start)
+    )
+    for dentist_id, window_start, window_end in windows:
+        calendars[dentist_id][0].append((max(window_start, start), min(window_end, end)))
+
+    rules = {dentist_id: [] for dentist_id in calendars}
+    rule_rows = await db.execute(
+        select(AvailabilityRule.dentist_id, AvailabilityRule.weekdays, AvailabilityRule.start_time,
+               AvailabilityRule.end_time, AvailabilityRule.valid_from, AvailabilityRule.valid_until).filter(
+            AvailabilityRule.dentist_id.in_(calendars), AvailabilityRule.valid_from <= end.date(),
+            AvailabilityRule.valid_until.is_(None) | (AvailabilityRule.valid_until >= start.date()))
+    )
+    for dentist_id, *rule in rule_rows:
+        rules[dentist_id].append(rule)
+    blocked = {dentist_id: [] for dentist_id in calendars}
+    exception_rows = await db.execute(
+        select(AvailabilityException.dentist_id, AvailabilityException.day, AvailabilityException.start_time,
+               AvailabilityException.end_time).filter(
+            AvailabilityException.dentist_id.in_(calendars), AvailabilityException.day >= start.date(),
+            AvailabilityException.day <= end.date())
+    )
+    for dentist_id, day, start_time, end_time in exception_rows:
+        blocked[dentist_id].append(exception_interval(day, start_time, end_time))
+    for dentist_id, dentist_rules in rules.items():
+        if dentist_rules:
+            recurring = free_intervals(sorted(expand_rules(dentist_rules, start, end)), sorted(blocked[dentist_id]))
+            calendars[dentist_id][0].extend(recurring)
+    return calendars
+
+
+async def load_bookings(db: AsyncSession, dentist_ids, start: datetime, end: datetime,
+                        exclude_id: Optional[int] = None) -> dict:
+    """Fetch the non-cancelled appointments overlapping ``[start, end)`` as ``{dentist_id: [interval]}``."""
+    bookings = {dentist_id: [] for dentist_id in dentist_ids}
+    stmt = select(Appointment.dentist_id, Appointment.starts_at, Appointment.ends_at).filter(
+        Appointment.dentist_id.in_(bookings), Appointment.status != "cancelled")
+    if exclude_id is not None:
+        stmt = stmt.filter(Appointment.id != exclude_id)
+    for dentist_id, starts_at, ends_at in await db.execute(overlapping(stmt, start, end)):
+        bookings[dentist_id].append((starts_at, ends_at))
+    return bookings
+
+
+def overlaps(interval, intervals) -> bool:
+    return any(start < interval[1] and interval[0] < end for start, end in intervals)
+
+
+def _clip(intervals, start: datetime, end: datetime) -> list:
+    return [(max(lo, start), min(hi, end)) for lo, hi in intervals if lo < end and hi > start]
+
+
+class CalendarIndex:
+    """Per-process cache of each dentist's availability windows and bookings, one entry per day.
+
+    Days are loaded lazily, with one query per table for all the days and dentists that missed.
+    Writers call ``invalidate``, which bumps a per-dentist generation instead of scanning the cache.
+    An entry from an older generation counts as a miss, so a load that raced a write is never
+    served. The TTL bounds staleness if a cross-worker notification is lost.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._days = LRUCache(maxsize, ttl)
+        self._generations = {}
+        self._epoch = 0
+
+    def _generation(self, dentist_id: int):
+        return self._epoch, self._generations.get(dentist_id, 0)
+
+    def invalidate(self, dentist_ids=None):
+        """Drop the cached days of ``dentist_ids``, or of every dentist when None."""
+        if dentist_ids is None:
+            self._epoch += 1
+            self._days.clear()
+            return
+        for dentist_id in dentist_ids:
+            self._generations[dentist_id] = self._generations.get(dentist_id, 0) + 1
+
+    def _get(self, dentist_id: int, day: date):
+        entry = self._days.get((dentist_id, day))
+        if entry is None or entry[0] != self._generation(dentist_id):
+            return None
+        return entry[1]
+
+    async def calendars(self, db: AsyncSession, dentist_ids, start: datetime, end: datetime) -> dict:
+        """Same result as ``load_calendars``, served from memory for the days already cached."""
+        days = [start.date() + timedelta(days=n) for n in range(((end - timedelta.resolution).date()
+                                                                  - start.date()).days + 1)]
+        found, missing = {}, set()
+        for dentist_id in dentist_ids:
+            for day in days:
+                entry = self._get(dentist_id, day)
+                if entry is None:
+                    missing.add((dentist_id, day))
+                else:
+                    found[dentist_id, day] = entry
+
+        if missing:
+            missing_dentists = {dentist_id for dentist_id, _ in missing}
+            generations = {dentist_id: self._generation(dentist_id) for dentist_id in missing_dentists}
+            first, last = min(day for _, day in missing), max(day for _, day in missing)
+            loaded = await load_calendars(db, missing_dentists, datetime.combine(first, time.min),
+                                          datetime.combine(last + timedelta(days=1), time.min))
+            for dentist_id, (windows, booked) in loaded.items():
+                windows, booked = sorted(windows), sorted(booked)
+                for day in days:
+                    if (dentist_id, day) not in missing:
+                        continue
+                    day_start = datetime.combine(day, time.min)
+                    day_end = day_start + timedelta(days=1)
+                    entry = (_clip(windows, day_start, day_end), _clip(booked, day_start, day_end))
+                    found[dentist_id, day] = entry
+                    self._days.set((dentist_id, day), (generations[dentist_id], entry))
+
+        calendars = {}
+        for dentist_id in dentist_ids:
+            windows = [window for day in days for window in found[dentist_id, day][0]]
+            booked = [interval for day in days for interval in found[dentist_id, day][1]]
+            calendars[dentist_id] = (_clip(windows, start, end), booked)
+        return calendars
+
+    def stats(self) -> dict:
+        return self._days.stats()
+
+
+calendar_index = CalendarIndex(settings.calendar_index_size, settings.calendar_index_ttl)
+
+
+async def publish_calendar_change(db: AsyncSession, dentist_ids=None):
+    """Invalidate the calendar index for ``dentist_ids`` (None for all) here and in every other worker.
+
+    Call after the write commits. Other workers hear about it through PostgreSQL NOTIFY; on other
+    databases there is only this process to tell.
+    """
+    calendar_index.invalidate(dentist_ids)
+    if db.bind.dialect.name == "postgresql":
+        payload = "*" if dentist_ids is None else ",".join(str(dentist_id) for dentist_id in set(dentist_ids))
+        await db.execute(select(func.pg_notify(CALENDAR_CHANNEL, payload)))
+        await db.commit()
+
+
+class CalendarChangeListener:
+    """Applies other workers' ``publish_calendar_change`` calls to this process's calendar index."""
+
+    def __init__(self, index: CalendarIndex):
+        self.index = index
+        self._connection = None
+
+    async def start(self):
+        if engine.dialect.name != "postgresql":
+            return
+        self._connection = await engine.connect()
+        raw_connection = await self._connection.get_raw_connection()
+        await raw_connection.driver_connection.add_listener(CALENDAR_CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.index.invalidate(None if payload == "*" else [int(dentist_id) for dentist_id in payload.split(",")])
+
+    async def stop(self):
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+calendar_listener = CalendarChangeListener(calendar_index)
+
+
+def _tagged(dentist_id: int, slots):
+    for start, end in slots:
+        yield start, dentist_id, end
+
+
+def earliest_slots(calendars: dict, duration: timedelta, limit: int) -> list:
+    """Return the ``limit`` earliest ``(start, dentist_id, end)`` slots across all ``calendars``.
+
+    Each dentist's slots are generated lazily and k-way merged on a heap, so a dentist's calendar is
+    only walked as far as it competes for the first ``limit`` places.
+    """
+    streams = [_tagged(dentist_id, free_slots(windows, booked, duration))
+               for dentist_id, (windows, booked) in calendars.items()]
+    return list(islice(heapq.merge(*streams), limit))
+
+
+async def first_available(db: AsyncSession, treatment_type: str, start: datetime, days: int, limit: int,
+                          speciality: Optional[str] = None) -> list:
+    """Find the earliest slots long enough for ``treatment_type`` with any dentist, optionally of one speciality.
+
+    The search horizon starts at one day and doubles up to ``days``, so a practice with free slots
+    tomorrow never loads next month's calendars.
+    """
+    stmt = select(Dentist.id)
+    if speciality:
+        stmt = stmt.filter(func.lower(Dentist.speciality) == speciality.lower())
+    dentist_ids = list((await db.execute(stmt)).scalars())
+    if not dentist_ids:
+        return []
+    duration, horizon = treatment_duration(treatment_type), 1
+    while True:
+        horizon = min(horizon, days)
+        calendars = await calendar_index.calendars(db, dentist_ids, start, start + timedelta(days=horizon))
+        slots = earliest_slots(calendars, duration, limit)
+        if len(slots) == limit or horizon == days:
+            return slots
+        horizon *= 2
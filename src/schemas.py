@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime, time
 from enum import Enum
 from typing import Optional
 
@@ -32,6 +32,15 @@ class InsuranceProvider(str, Enum):
 
 
 # src/schemas.py
+class BulkDelete(BaseModel):
+    ids: list[int] = Field(..., description="The IDs of the records to delete")
+
+
+class BulkDeleteResult(BaseModel):
+    deleted: list[int] = Field(..., description="The IDs that were deleted")
+    not_found: list[int] = Field(..., description="The IDs that did not match any record")
+
+
 class UserCreate(BaseModel):
     username: constr(min_length=3, max_length=50) = Field(..., description="The username of the user")
     password: constr(min_length=8) = Field(..., description="The password of the user")
@@ -60,6 +69,19 @@ class AppointmentCreate(BaseModel):
     treatment_type: TreatmentType = Field(..., description="The type of treatment for the appointment")
 
 
+class AppointmentBatchStatus(str, Enum):
+    created = "created"
+    conflict = "conflict"
+    invalid = "invalid"
+
+
+class AppointmentBatchResult(BaseModel):
+    index: int = Field(..., description="The position of the payload in the submitted batch")
+    status: AppointmentBatchStatus = Field(..., description="Whether the appointment was booked")
+    appointment_id: Optional[int] = Field(None, description="The ID of the created appointment")
+    detail: Optional[str] = Field(None, description="Why the appointment was not booked")
+
+
 class Appointment(BaseModel):
     id: int = Field(..., description="The unique ID of the appointment")
     patient_id: int = Field(..., description="The ID of the patient")
@@ -68,6 +90,8 @@ class Appointment(BaseModel):
     treatment_type: TreatmentType = Field(..., description="The type of treatment for the appointment")
     notes: Optional[str] = Field(None, description="Additional notes for the appointment")
     cost: Optional[float] = Field(None, description="The cost of the appointment")
+    starts_at: Optional[datetime] = Field(None, description="When the appointment starts")
+    ends_at: Optional[datetime] = Field(None, description="When the appointment is expected to end")
 
     class Config:
         from_attributes = True
@@ -87,6 +111,25 @@ class PatientCreate(BaseModel):
     insurance_policy_number: Optional[str] = Field(None, description="The insurance policy number")
 
 
+class FileFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class PatientImportError(BaseModel):
+    line: int = Field(..., description="The line of the upload the row starts on")
+    email: Optional[str] = Field(None, description="The email of the rejected row, when it could be read")
+    error: str = Field(..., description="Why the row was not imported")
+
+
+class PatientImportResult(BaseModel):
+    inserted: int = Field(..., description="The number of patients imported")
+    duplicates: int = Field(..., description="The number of rows skipped because the email is already registered")
+    invalid: int = Field(..., description="The number of rows that failed validation")
+    errors: list[PatientImportError] = Field(..., description="One entry per row not imported, up to the limit")
+    errors_truncated: bool = Field(False, description="Whether more rows were rejected than are listed in errors")
+
+
 class Patient(BaseModel):
     id: int = Field(..., description="The unique ID of the patient")
     first_name: str = Field(..., description="The first name of the patient")
@@ -94,7 +137,7 @@ class Patient(BaseModel):
     email: str = Field(..., description="The email of the patient")
     phone_number: Optional[str] = Field(None, description="The phone number of the patient")
     address: Optional[str] = Field(None, description="The address of the patient")
-    date_of_birth: Optional[str] = Field(None, description="The date of birth of the patient")
+    date_of_birth: Optional[datetime] = Field(None, description="The date of birth of the patient")
     emergency_contact_name: Optional[str] = Field(None, description="The name of the emergency contact")
     emergency_contact_phone: Optional[str] = Field(None, description="The phone number of the emergency contact")
     medical_history: Optional[str] = Field(None, description="The medical history of the patient")
@@ -154,6 +197,53 @@ class Availability(BaseModel):
         from_attributes = True
 
 
+class Weekday(str, Enum):
+    monday = "Monday"
+    tuesday = "Tuesday"
+    wednesday = "Wednesday"
+    thursday = "Thursday"
+    friday = "Friday"
+    saturday = "Saturday"
+    sunday = "Sunday"
+
+
+class AvailabilityRuleCreate(BaseModel):
+    dentist_id: int = Field(..., description="The ID of the dentist")
+    weekdays: list[Weekday] = Field(..., min_length=1, description="The days of the week the rule applies to")
+    start_time: time = Field(..., description="The time of day availability starts, in HH:MM format")
+    end_time: time = Field(..., description="The time of day availability ends, in HH:MM format")
+    valid_from: date = Field(..., description="The first date the rule applies to")
+    valid_until: Optional[date] = Field(None, description="The last date the rule applies to; open-ended if omitted")
+
+
+class AvailabilityRule(AvailabilityRuleCreate):
+    id: int = Field(..., description="The unique ID of the availability rule")
+
+
+class AvailabilityExceptionCreate(BaseModel):
+    dentist_id: int = Field(..., description="The ID of the dentist")
+    day: date = Field(..., description="The date the dentist's recurring availability does not apply")
+    start_time: Optional[time] = Field(None, description="Start of the blocked time; the whole day if omitted")
+    end_time: Optional[time] = Field(None, description="End of the blocked time; the whole day if omitted")
+    reason: Optional[str] = Field(None, description="Why the dentist is unavailable")
+
+
+class AvailabilityException(AvailabilityExceptionCreate):
+    id: int = Field(..., description="The unique ID of the availability exception")
+
+    class Config:
+        from_attributes = True
+
+
+class Slot(BaseModel):
+    start: datetime = Field(..., description="When the slot starts")
+    end: datetime = Field(..., description="When the slot ends")
+
+
+class DentistSlot(Slot):
+    dentist_id: int = Field(..., description="The ID of the dentist")
+
+
 class DentistCreate(BaseModel):
     first_name: str = Field(..., description="The first name of the dentist")
     last_name: str = Field(..., description="The last name of the dentist")
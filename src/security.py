@@ -1,4 +1,5 @@
 # src/security.py
+import time
 from datetime import datetime, timedelta
 
 from jose import jwt
@@ -10,8 +11,10 @@ ALGORITHM = "HS256"
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-        to_encode.update({"exp": expire})
+    if expires_delta is None:
+        expires_delta = timedelta(minutes=settings.access_token_expire_minutes)
+    expire = datetime.utcnow() + expires_delta
+    # Sub-second iat so a token minted right after a revocation is not mistaken for a revoked one.
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret, algorithm=ALGORITHM)
     return encoded_jwt
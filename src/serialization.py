@@ -0,0 +1,78 @@
+# src/serialization.py
+"""Opt-in fast path for encoding list responses.
+
+By default FastAPI validates every ORM row against the route's ``response_model`` and then runs
+``jsonable_encoder`` over the result before encoding it. With ``FAST_JSON_RESPONSES`` enabled, list
+routes instead read each schema field straight off the row and hand the plain dicts to
+``FastJSONResponse``, which encodes them with orjson when it is installed. The output is the same
+JSON; only the validation pass and the extra copy are skipped, so use it for schemas whose fields
+are plain column attributes. Responses trimmed to a sparse fieldset take the same path.
+"""
+import json
+from datetime import date, time
+from enum import Enum
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from src.config import settings
+
+try:
+    import orjson
+except ImportError:  # Optional dependency: fall back to the standard library encoder.
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson, or with ``json`` when orjson isn't installed."""
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dump_rows(rows, schema, fields: list = None) -> list:
+    """The ``schema`` fields (or just ``fields``) of each ORM row as plain dicts, without pydantic validation."""
+    fields = list(schema.model_fields) if fields is None else fields
+    return [{field: getattr(row, field) for field in fields} for row in rows]
+
+
+def _fast_response(content, response: Response = None) -> FastJSONResponse:
+    fast_response = FastJSONResponse(content)
+    if response is not None:
+        # FastAPI doesn't apply the injected response's headers (e.g. the next-page cursor) to a
+        # response the route returns itself.
+        fast_response.headers.raw.extend(response.headers.raw)
+    return fast_response
+
+
+def list_response(rows, schema, response: Response = None, fields: list = None):
+    """Return ``rows`` for the usual ``response_model`` path, or a ``FastJSONResponse`` when enabled.
+
+    A sparse fieldset (``fields``, see ``src.fieldsets``) always takes the direct path, since the
+    rows only have those columns loaded. ``response`` is the route's injected response, whose
+    headers are carried over.
+    """
+    if fields is None and not settings.fast_json_responses:
+        return rows
+    return _fast_response(dump_rows(rows, schema, fields), response)
+
+
+def item_response(row, schema, response: Response = None, fields: list = None, related: dict = None):
+    """``list_response`` for a single row.
+
+    Only a sparse fieldset or ``related`` collections to embed (see ``src.includes``) bypass
+    ``response_model``.
+    """
+    if fields is None and not related:
+        return row
+    return _fast_response({**dump_rows([row], schema, fields)[0], **(related or {})}, response)
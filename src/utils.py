@@ -1,4 +1,7 @@
 # src/utils.py
+from datetime import datetime, timezone
+from typing import Optional
+
 import bcrypt
 
 
@@ -10,3 +13,22 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password."""
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convert a timezone-aware datetime to the naive UTC the database columns store; naive values pass through."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def parse_timestamps(values: dict, *names: str) -> dict:
+    """Parse the ISO 8601 strings under ``names`` to naive UTC datetimes for ``DateTime`` columns.
+
+    asyncpg binds parameters as given and rejects a string for a timestamp, so request fields typed
+    as ``str`` are converted here first. Raises ValueError for a malformed value.
+    """
+    for name in names:
+        if isinstance(values.get(name), str):
+            values[name] = naive_utc(datetime.fromisoformat(values[name]))
+    return values
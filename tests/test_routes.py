@@ -1,8 +1,36 @@
+import asyncio
+import contextlib
+import csv
 import datetime
+import io
+import json
+import time
+from types import SimpleNamespace
 
+import httpx
 from fastapi.testclient import TestClient
-
+from sqlalchemy import Date, Time, bindparam, create_engine, event, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from src import database, patient_import
+from src.cache import LRUCache
+from src.config import settings
+from src.constants import InsuranceProvider
+from src.database import Base, get_read_db, make_async_url
+from src.dental_service import appointments_in_range_query
+from src.explain import explain, seq_scans
+from src.hashing import HashingExecutor, hashing_executor
 from src.main import app
+from src.memory_redis import MemoryRedis
+from src.migrations import LATEST_VERSION, schema_is_current, schema_version, upgrade
+from src.models import Appointment, Availability, Billing, Dentist, Feedback, Insurance, Patient, Report
+from src.response_cache import (NOTIFY_PAYLOAD_LIMIT, InvalidationListener, LocalBackend, RedisBackend,
+                                ResponseCache, notify_payloads)
+from src.scheduling import calendar_index
+from src.security import create_access_token
 
 client = TestClient(app)
 
@@ -202,6 +230,15 @@ def test_create_availability(setup_database):
     assert availability_response.status_code == 200
     assert availability_response.json().get("id") is not None
 
+    update_response = client.put(f"availability/{availability_response.json()['id']}", json={
+        "dentist_id": dentist_id,
+        "day_of_week": "Tuesday",
+        "start_time": "2023-10-10T10:00:00+02:00",
+        "end_time": "2023-10-10T17:00"
+    })
+    assert update_response.status_code == 200
+    assert update_response.json()["day_of_week"] == "Tuesday"
+
 
 def test_create_billing(setup_database):
     # Register a new user with the required role field
@@ -667,3 +704,989 @@ def test_create_and_get_patient(setup_database):
     get_response = client.get(f"/patient/patients/{patient_id}")
     assert get_response.status_code == 200
     assert get_response.json()["first_name"] == "John"
+
+
+def test_register_rejected_when_hashing_pool_saturated(setup_database, monkeypatch):
+    monkeypatch.setattr(hashing_executor, "max_pending", 0)
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "password": "testpassword",
+        "role": "patient"
+    })
+    assert response.status_code == 429
+    assert client.get("/metrics/hashing").json()["rejected"] >= 1
+
+
+def test_hashing_pool_survives_shutdown():
+    # The app's shutdown stops the pool; a later lifespan's first call must start a new one.
+    pool = HashingExecutor(max_workers=1, max_pending=4)
+
+    async def run():
+        first = await pool.run(sum, [1, 2])
+        pool.shutdown()
+        return first, await pool.run(sum, [3, 4])
+
+    assert asyncio.run(run()) == (3, 7)
+    assert pool.stats()["completed"] == 2
+    pool.shutdown()
+
+
+def test_deleted_user_token_is_rejected(setup_database):
+    register_response = client.post("/auth/register",
+                                    json={"username": "testuser", "password": "testpassword", "role": "patient"})
+    assert register_response.status_code == 200, f"User registration failed: {register_response.json()}"
+    user_id = register_response.json()["id"]
+
+    login_response = client.post("/auth/token", data={"username": "testuser", "password": "testpassword"})
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    assert client.get("/user/me", headers=headers).status_code == 200
+    assert client.get("/user/me", headers=headers).status_code == 200
+    assert client.get("/metrics/principal-cache").json()["hits"] >= 1
+
+    assert client.delete(f"/user/{user_id}").status_code == 200
+    assert client.get("/user/me", headers=headers).status_code == 401
+
+
+def test_get_current_user_from_token_claims(setup_database):
+    # No users row exists: the principal comes entirely from the token's claims.
+    token = create_access_token(data={"sub": "claimsuser", "uid": 42, "role": "dentist", "active": True})
+    response = client.get("/user/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json() == {"id": 42, "username": "claimsuser", "role": "dentist"}
+
+    inactive = create_access_token(data={"sub": "claimsuser", "uid": 42, "role": "dentist", "active": False})
+    response = client.get("/user/me", headers={"Authorization": f"Bearer {inactive}"})
+    assert response.status_code == 401
+
+
+def test_pool_metrics():
+    response = client.get("/metrics/pool")
+    assert response.status_code == 200
+    assert {"in_use", "idle", "checkout_histogram", "timeouts"} <= response.json().keys()
+
+
+def session_for(dependency, request) -> str:
+    async def route():
+        sessions = dependency(request)
+        db = await anext(sessions)
+        await sessions.aclose()
+        return db
+
+    return asyncio.run(route())
+
+
+def fake_session_factory(name):
+    @contextlib.asynccontextmanager
+    async def factory():
+        yield name
+
+    return factory
+
+
+def fake_request(method="GET", token="a"):
+    return SimpleNamespace(method=method, headers={"authorization": f"Bearer {token}"}, client=None)
+
+
+def test_read_db_routing(monkeypatch):
+    monkeypatch.setattr(database, "read_engine", object())
+    monkeypatch.setattr(database, "SessionLocal", fake_session_factory("primary"))
+    monkeypatch.setattr(database, "ReadSessionLocal", fake_session_factory("replica"))
+    monkeypatch.setattr(database, "recent_writers", LRUCache(100, 0.2))
+    fresh = [True]
+
+    async def replica_is_fresh():
+        return fresh[0]
+
+    monkeypatch.setattr(database.replica_monitor, "replica_is_fresh", replica_is_fresh)
+
+    def routed(token="a"):
+        return session_for(database.get_read_db, fake_request(token=token))
+
+    assert routed() == "replica"
+
+    # A write pins that client, and only that client, to the primary for the read-your-writes window.
+    session_for(database.get_db, fake_request("POST"))
+    assert (routed(), routed("b")) == ("primary", "replica")
+    time.sleep(0.25)
+    assert routed() == "replica"
+
+    fresh[0] = False
+    assert routed("b") == "primary"
+
+
+class FakeReplica:
+    """A read engine whose lag query returns, or raises, each of ``results`` in turn."""
+
+    def __init__(self, *results):
+        self.dialect = SimpleNamespace(name="postgresql")
+        self.results = list(results)
+        self.checks = 0
+
+    @contextlib.asynccontextmanager
+    async def connect(self):
+        self.checks += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+
+        async def execute(statement):
+            return SimpleNamespace(scalar=lambda: result)
+
+        yield SimpleNamespace(execute=execute)
+
+
+def test_replica_lag_monitor(monkeypatch):
+    replica = FakeReplica(1.0, 30.0, None, OSError("replica down"))
+    monkeypatch.setattr(database, "read_engine", replica)
+    monitor = database.ReplicaLagMonitor(max_lag=5, check_interval=0)
+    # Within the lag limit, beyond it, replayed everything, and unreachable.
+    assert [asyncio.run(monitor.replica_is_fresh()) for _ in range(4)] == [True, False, True, False]
+
+    replica = FakeReplica(30.0, 1.0)
+    monkeypatch.setattr(database, "read_engine", replica)
+    monitor = database.ReplicaLagMonitor(max_lag=5, check_interval=60)
+    # The verdict is cached for check_interval, so the second call doesn't query.
+    assert [asyncio.run(monitor.replica_is_fresh()) for _ in range(2)] == [False, False]
+    assert replica.checks == 1
+
+
+def test_replica_pool_is_instrumented(tmp_path):
+    replica = create_async_engine(make_async_url(f"sqlite:///{tmp_path / 'replica.db'}"),
+                                  poolclass=database.ReplicaPool)
+    before = (database.replica_pool_metrics.checkout_count, database.pool_metrics.checkout_count)
+
+    async def query():
+        async with replica.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        await replica.dispose()
+
+    asyncio.run(query())
+    after = (database.replica_pool_metrics.checkout_count, database.pool_metrics.checkout_count)
+    assert (after[0] - before[0], after[1] - before[1]) == (1, 0)
+    # No READ_DATABASE_URL in the tests, so there is no replica pool to report.
+    assert client.get("/metrics/replica-pool").json() == {}
+
+
+def test_update_patient(setup_database):
+    patient_id = client.post("/patient/patients", json={
+        "first_name": "John",
+        "last_name": "Doe",
+        "email": "john.doe@example.com"
+    }).json()["id"]
+
+    response = client.put(f"/patient/patients/{patient_id}", json={
+        "first_name": "John",
+        "last_name": "Smith",
+        "email": "john.smith@example.com",
+        "date_of_birth": "1990-05-01"
+    })
+    assert response.status_code == 200
+    assert response.json()["last_name"] == "Smith"
+    stored = client.get(f"/patient/patients/{patient_id}").json()
+    assert (stored["email"], stored["date_of_birth"]) == ("john.smith@example.com", "1990-05-01T00:00:00")
+
+    missing = client.put("/patient/patients/9999", json={
+        "first_name": "John",
+        "last_name": "Smith",
+        "email": "nobody@example.com"
+    })
+    assert missing.status_code == 404
+
+
+def test_delete_and_bulk_delete_dentists(setup_database):
+    dentist_ids = [
+        client.post("/dentist/dentists", json={"first_name": "Jane", "last_name": f"Doe {i}"}).json()["id"]
+        for i in range(3)
+    ]
+
+    assert client.delete(f"/dentist/dentists/{dentist_ids[0]}").status_code == 200
+    assert client.delete(f"/dentist/dentists/{dentist_ids[0]}").status_code == 404
+
+    response = client.post("/dentist/dentists/bulk-delete", json={"ids": dentist_ids + [9999]})
+    assert response.status_code == 200
+    assert response.json() == {"deleted": dentist_ids[1:], "not_found": [dentist_ids[0], 9999]}
+    assert client.get(f"/dentist/dentists/{dentist_ids[1]}").status_code == 404
+
+
+def test_create_appointments_batch(setup_database, staff_headers):
+    patient_id = client.post("/patient/patients", json={
+        "first_name": "John",
+        "last_name": "Doe",
+        "email": "john.doe@example.com"
+    }).json()["id"]
+    dentist_id = client.post("/dentist/dentists", json={"first_name": "Jane", "last_name": "Smith"}).json()["id"]
+
+    slot = {"patient_id": patient_id, "dentist_id": dentist_id, "date": "2024-09-11", "time": "09:00",
+            "treatment_type": "cleaning"}
+    response = client.post("/appointment/dental/appointments/batch", headers=staff_headers, json=[
+        slot,
+        {**slot, "time": "10:00"},
+        slot,
+        {**slot, "time": "11:00", "patient_id": 9999},
+        {**slot, "time": "not a time"},
+        {"patient_id": patient_id},
+    ])
+    assert response.status_code == 200, response.json()
+    statuses = [item["status"] for item in response.json()]
+    assert statuses == ["created", "created", "conflict", "invalid", "invalid", "invalid"]
+    assert response.json()[0]["appointment_id"] != response.json()[1]["appointment_id"]
+
+    again = client.post("/appointment/dental/appointments/batch", headers=staff_headers, json=[slot])
+    assert again.json()[0]["status"] == "conflict"
+
+
+def test_import_patients_csv(setup_database, monkeypatch):
+    client.post("/patient/patients", json={"first_name": "John", "last_name": "Doe", "email": "john.doe@example.com"})
+    upload = (
+        "first_name,last_name,email,address,insurance_provider\r\n"
+        'Jane,Smith,jane@example.com,"1 Main St\nSpringfield",Provider A\r\n'
+        "John,Doe,john.doe@example.com,,\r\n"
+        "Jane,Smith,jane@example.com,,\r\n"
+        ",Nobody,nobody@example.com,,\r\n"
+        "Too,Few,fields\r\n"
+        "Ann,Lee,ann@example.com,,Provider Z\r\n"
+        "Bob,Ray,bob@example.com,,\r\n"
+    )
+    response = client.post("/patient/patients/import?format=csv", content=upload,
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200, response.json()
+    result = response.json()
+    assert (result["inserted"], result["duplicates"], result["invalid"]) == (2, 2, 3)
+    assert sorted(error["line"] for error in result["errors"]) == [4, 5, 6, 7, 8]
+    assert not result["errors_truncated"]
+
+    ndjson = '{"first_name": "Cy", "last_name": "Po", "email": "cy@example.com"}\nnot json\n'
+    response = client.post("/patient/patients/import?format=ndjson", content=ndjson)
+    assert (response.json()["inserted"], response.json()["invalid"]) == (1, 1)
+
+    # A quote inside an unquoted field is literal; one left open is reported, not silently dropped.
+    monkeypatch.setattr(patient_import, "MAX_RECORD_LINES", 3)
+    upload = (
+        "first_name,last_name,email,address\n"
+        'Ann,O"Neil,ann.oneil@example.com,\n'
+        'Al,Po,al@example.com,"1 Main St\n'
+        "no closing\nquote\n"
+        "Di,Ro,di@example.com,\n"
+        'Ed,Su,ed@example.com,"unclosed\n'
+    )
+    result = client.post("/patient/patients/import?format=csv", content=upload).json()
+    assert (result["inserted"], result["invalid"]) == (2, 2)
+    assert [error["line"] for error in result["errors"]] == [3, 7]
+
+    monkeypatch.setattr(settings, "import_error_limit", 2)
+    response = client.post("/patient/patients/import?format=ndjson", content="not json\n" * 5)
+    assert response.json()["invalid"] == 5
+    assert len(response.json()["errors"]) == 2
+    assert response.json()["errors_truncated"]
+
+
+def test_availability_keyset_pagination(db_session):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    db_session.add(dentist)
+    db_session.flush()
+    db_session.add_all([
+        Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2023, 10, day, 9),
+                     end_time=datetime.datetime(2023, 10, day, 17))
+        for day in range(1, 6)
+    ])
+    db_session.commit()
+    dentist_id = dentist.id
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/availability/{dentist_id}", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == 5 and seen == sorted(seen)
+
+    assert client.get(f"/availability/{dentist_id}", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_export_appointments_and_billing(db_session, staff_headers):
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    dentists = [Dentist(first_name="Jane", last_name="Smith"), Dentist(first_name="Ann", last_name="Lee")]
+    db_session.add_all([patient, *dentists])
+    db_session.flush()
+    appointments = [
+        Appointment(patient_id=patient.id, dentist_id=dentists[day % 2].id, date=datetime.date(2024, 1, day),
+                    time=datetime.time(9, 0), treatment_type="cleaning")
+        for day in range(1, 7)
+    ]
+    db_session.add_all(appointments)
+    db_session.flush()
+    db_session.add_all([
+        Billing(appointment_id=appointment.id, patient_id=patient.id, amount_due=100.0, payment_status="pending")
+        for appointment in appointments
+    ])
+    db_session.commit()
+
+    response = client.get("/appointment/dental/appointments/export", headers=staff_headers,
+                          params={"from": "2024-01-02", "to": "2024-01-05", "dentist_id": dentists[0].id})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["date"] for row in rows] == ["2024-01-02", "2024-01-04"]
+
+    response = client.get("/billing/export", headers=staff_headers,
+                          params={"format": "csv", "dentist_id": dentists[1].id})
+    assert response.status_code == 200
+    lines = list(csv.reader(io.StringIO(response.text)))
+    assert lines[0][:3] == ["id", "appointment_id", "patient_id"]
+    assert len(lines) == 4
+
+    assert client.get("/billing/export").status_code == 401
+
+
+def test_get_free_slots(db_session):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([dentist, patient])
+    db_session.flush()
+    db_session.add_all([
+        Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2024, 1, 1, 9),
+                     end_time=datetime.datetime(2024, 1, 1, 12)),
+        Availability(dentist_id=dentist.id, day_of_week="Tuesday", start_time=datetime.datetime(2024, 1, 2, 9),
+                     end_time=datetime.datetime(2024, 1, 2, 10)),
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, 1),
+                    time=datetime.time(9, 30), treatment_type="root_canal"),
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, 1),
+                    time=datetime.time(11, 0), treatment_type="cleaning", status="cancelled"),
+    ])
+    db_session.commit()
+
+    response = client.get(f"/availability/{dentist.id}/slots",
+                          params={"from": "2024-01-01T00:00", "to": "2024-01-02T09:30", "duration": 30})
+    assert response.status_code == 200
+    assert [slot["start"] for slot in response.json()] == [
+        "2024-01-01T09:00:00", "2024-01-01T11:00:00", "2024-01-01T11:30:00", "2024-01-02T09:00:00",
+    ]
+
+    # Aware bounds are converted to UTC: 10:00+01:00 is 09:00.
+    aware = client.get(f"/availability/{dentist.id}/slots",
+                       params={"from": "2024-01-02T10:00:00+01:00", "to": "2024-01-02T09:30:00Z", "duration": 30})
+    assert aware.status_code == 200
+    assert [slot["start"] for slot in aware.json()] == ["2024-01-02T09:00:00"]
+
+    assert client.get(f"/availability/{dentist.id}/slots",
+                      params={"from": "2024-01-02T00:00", "to": "2024-01-01T00:00"}).status_code == 422
+    assert client.get(f"/availability/{dentist.id}/slots",
+                      params={"from": "2024-01-01T00:00", "to": "2124-01-01T00:00"}).status_code == 422
+
+
+def test_first_available_across_dentists(db_session):
+    surgeon = Dentist(first_name="Jane", last_name="Doe", speciality="Endodontics")
+    other_surgeon = Dentist(first_name="Ann", last_name="Lee", speciality="endodontics")
+    hygienist = Dentist(first_name="Bob", last_name="Ray", speciality="Hygiene")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([surgeon, other_surgeon, hygienist, patient])
+    db_session.flush()
+    db_session.add_all([
+        Availability(dentist_id=surgeon.id, day_of_week="Monday", start_time=datetime.datetime(2024, 1, 1, 9),
+                     end_time=datetime.datetime(2024, 1, 1, 12)),
+        Availability(dentist_id=other_surgeon.id, day_of_week="Friday", start_time=datetime.datetime(2024, 1, 5, 8),
+                     end_time=datetime.datetime(2024, 1, 5, 12)),
+        Availability(dentist_id=hygienist.id, day_of_week="Monday", start_time=datetime.datetime(2024, 1, 1, 8),
+                     end_time=datetime.datetime(2024, 1, 1, 12)),
+        Appointment(patient_id=patient.id, dentist_id=surgeon.id, date=datetime.date(2024, 1, 1),
+                    time=datetime.time(9, 0), treatment_type="cleaning"),
+    ])
+    db_session.commit()
+
+    response = client.get("/availability/first-available", params={
+        "treatment_type": "root_canal", "speciality": "Endodontics", "from": "2024-01-01T00:00", "limit": 3})
+    assert response.status_code == 200
+    assert [(slot["dentist_id"], slot["start"]) for slot in response.json()] == [
+        (surgeon.id, "2024-01-01T09:30:00"), (other_surgeon.id, "2024-01-05T08:00:00"),
+        (other_surgeon.id, "2024-01-05T09:30:00"),
+    ]
+
+    aware = client.get("/availability/first-available", params={
+        "treatment_type": "root_canal", "speciality": "Endodontics", "from": "2024-01-05T10:00:00+02:00", "limit": 1})
+    assert aware.status_code == 200
+    assert [(slot["dentist_id"], slot["start"]) for slot in aware.json()] == [(other_surgeon.id, "2024-01-05T08:00:00")]
+
+
+def test_concurrent_bookings_never_double_book(db_session, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patients = [Patient(first_name="John", last_name="Doe", email=f"john{i}@example.com") for i in range(20)]
+    db_session.add_all([dentist, *patients])
+    db_session.commit()
+
+    async def book_all():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/appointment/dental/appointments", headers=staff_headers, json={
+                    "patient_id": patient.id,
+                    "dentist_id": dentist.id,
+                    "date": "2024-09-11",
+                    "time": "09:00",
+                    "treatment_type": "cleaning"
+                })
+                for patient in patients
+            ))
+
+    responses = asyncio.run(book_all())
+    assert sorted(response.status_code for response in responses) == [200] + [409] * 19
+    assert db_session.query(Appointment).filter(Appointment.dentist_id == dentist.id).count() == 1
+
+    overlapping = client.post("/appointment/dental/appointments", headers=staff_headers, json={
+        "patient_id": patients[0].id,
+        "dentist_id": dentist.id,
+        "date": "2024-09-11",
+        "time": "09:15",
+        "treatment_type": "filling"
+    })
+    assert overlapping.status_code == 409
+
+
+def test_concurrent_overlapping_bookings_at_different_times(db_session, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patients = [Patient(first_name="John", last_name="Doe", email=f"john{i}@example.com") for i in range(10)]
+    db_session.add_all([dentist, *patients])
+    db_session.commit()
+
+    async def book_all():
+        # 90-minute root canals starting five minutes apart: every pair overlaps, but no two share a start time.
+        async with httpx.AsyncClient(app=app, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.post("/appointment/dental/appointments", headers=staff_headers, json={
+                    "patient_id": patient.id,
+                    "dentist_id": dentist.id,
+                    "date": "2024-09-11",
+                    "time": f"09:{i * 5:02d}",
+                    "treatment_type": "root_canal"
+                })
+                for i, patient in enumerate(patients)
+            ))
+
+    responses = asyncio.run(book_all())
+    assert sorted(response.status_code for response in responses) == [200] + [409] * 9
+    assert db_session.query(Appointment).filter(Appointment.dentist_id == dentist.id).count() == 1
+
+
+def test_booking_unknown_rows_is_not_found(db_session, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([dentist, patient])
+    db_session.commit()
+    slot = {"patient_id": patient.id, "dentist_id": dentist.id, "date": "2024-09-11", "time": "09:00",
+            "treatment_type": "cleaning"}
+    assert client.post("/appointment/dental/appointments", headers=staff_headers, json=slot).status_code == 200
+
+    unknown_dentist = client.post("/appointment/dental/appointments", headers=staff_headers,
+                                  json={**slot, "dentist_id": 9999})
+    assert (unknown_dentist.status_code, unknown_dentist.json()["detail"]) == (404, "Dentist not found")
+    # Overlaps the booking above, but there is no appointment 9999 to move.
+    missing = client.put("/appointment/dental/appointments/9999", headers=staff_headers, json=slot)
+    assert (missing.status_code, missing.json()["detail"]) == (404, "Appointment not found")
+    unknown_patient = client.put("/appointment/dental/appointments/1", headers=staff_headers,
+                                 json={**slot, "patient_id": 9999})
+    assert (unknown_patient.status_code, unknown_patient.json()["detail"]) == (404, "Patient not found")
+
+
+def test_calendar_index_serves_slots_and_sees_bookings(db_session, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([dentist, patient])
+    db_session.flush()
+    db_session.add(Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2024, 1, 1, 9),
+                                end_time=datetime.datetime(2024, 1, 1, 10)))
+    db_session.commit()
+    params = {"from": "2024-01-01T00:00", "to": "2024-01-02T00:00", "duration": 30}
+
+    def slot_starts():
+        return [slot["start"] for slot in client.get(f"/availability/{dentist.id}/slots", params=params).json()]
+
+    assert slot_starts() == ["2024-01-01T09:00:00", "2024-01-01T09:30:00"]
+    hits = client.get("/metrics/calendar-index").json()["hits"]
+    assert slot_starts() == ["2024-01-01T09:00:00", "2024-01-01T09:30:00"]
+    assert client.get("/metrics/calendar-index").json()["hits"] > hits
+
+    response = client.post("/appointment/dental/appointments", headers=staff_headers, json={
+        "patient_id": patient.id,
+        "dentist_id": dentist.id,
+        "date": "2024-01-01",
+        "time": "09:00",
+        "treatment_type": "cleaning"
+    })
+    assert response.status_code == 200
+    assert slot_starts() == ["2024-01-01T09:30:00"]
+
+
+def test_deletes_invalidate_only_the_affected_dentists(db_session, staff_headers, monkeypatch):
+    dentists = [Dentist(first_name="Jane", last_name="Doe"), Dentist(first_name="Ann", last_name="Lee")]
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([*dentists, patient])
+    db_session.flush()
+    appointments = [
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, day),
+                    time=datetime.time(9, 0), treatment_type="cleaning")
+        for day, dentist in ((1, dentists[0]), (2, dentists[0]), (3, dentists[1]))
+    ]
+    windows = [
+        Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2024, 1, 1, 9),
+                     end_time=datetime.datetime(2024, 1, 1, 12))
+        for dentist in dentists
+    ]
+    db_session.add_all([*appointments, *windows])
+    db_session.commit()
+    invalidated = []
+    monkeypatch.setattr(calendar_index, "invalidate", lambda dentist_ids=None: invalidated.append(dentist_ids))
+    first, second = dentists[0].id, dentists[1].id
+
+    assert client.delete(f"/appointment/dental/appointments/{appointments[0].id}",
+                         headers=staff_headers).status_code == 200
+    assert client.post("/appointment/dental/appointments/bulk-delete", headers=staff_headers,
+                       json={"ids": [appointments[1].id, appointments[2].id]}).status_code == 200
+    assert client.delete(f"/availability/{windows[1].id}").status_code == 200
+    assert client.post("/availability/bulk-delete", json={"ids": [windows[0].id, 9999]}).status_code == 200
+    assert [set(dentist_ids) for dentist_ids in invalidated] == [{first}, {first, second}, {second}, {first}]
+
+
+def test_recurring_availability_rules(db_session):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    db_session.add(dentist)
+    db_session.commit()
+
+    response = client.post("/availability/rules", json={
+        "dentist_id": dentist.id,
+        "weekdays": ["Monday", "Wednesday"],
+        "start_time": "09:00",
+        "end_time": "10:00",
+        "valid_from": "2024-01-01"
+    })
+    assert response.status_code == 200, response.json()
+    assert response.json()["weekdays"] == ["Monday", "Wednesday"]
+    assert client.get(f"/availability/rules/{dentist.id}").json()[0]["id"] == response.json()["id"]
+
+    # 2024-01-01 is a Monday; the following Monday is blocked from 09:30.
+    exception = client.post("/availability/exceptions", json={
+        "dentist_id": dentist.id, "day": "2024-01-08", "start_time": "09:30", "end_time": "10:00"})
+    assert exception.status_code == 200, exception.json()
+
+    slots = client.get(f"/availability/{dentist.id}/slots",
+                       params={"from": "2024-01-01T00:00", "to": "2024-01-09T00:00", "duration": 60}).json()
+    assert [slot["start"] for slot in slots] == ["2024-01-01T09:00:00", "2024-01-03T09:00:00"]
+
+    assert client.post("/availability/rules", json={
+        "dentist_id": dentist.id, "weekdays": [], "start_time": "09:00", "end_time": "10:00",
+        "valid_from": "2024-01-01"}).status_code == 422
+
+
+def test_appointments_in_range_uses_dentist_start_index(db_session, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([dentist, patient])
+    db_session.flush()
+    db_session.add_all([
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, day),
+                    time=datetime.time(9, 0), treatment_type="root_canal")
+        for day in range(1, 15)
+    ])
+    db_session.commit()
+
+    response = client.get("/appointment/dental/appointments", headers=staff_headers, params={
+        "dentist_id": dentist.id, "from": "2024-01-03T10:00", "to": "2024-01-08T00:00"})
+    assert response.status_code == 200
+    assert [appointment["starts_at"] for appointment in response.json()] == [
+        "2024-01-03T09:00:00", "2024-01-04T09:00:00", "2024-01-05T09:00:00", "2024-01-06T09:00:00",
+        "2024-01-07T09:00:00",
+    ]
+    aware = client.get("/appointment/dental/appointments", headers=staff_headers, params={
+        "dentist_id": dentist.id, "from": "2024-01-03T12:00:00+02:00", "to": "2024-01-05T00:00:00Z"})
+    assert [appointment["starts_at"] for appointment in aware.json()] == ["2024-01-03T09:00:00", "2024-01-04T09:00:00"]
+
+    stmt = appointments_in_range_query(dentist.id, datetime.datetime(2024, 1, 3), datetime.datetime(2024, 1, 8))
+    connection = db_session.connection()
+    if connection.dialect.name == "postgresql":
+        # A handful of rows is cheaper to scan; ask whether the index is usable, not whether it's chosen.
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    assert "ix_appointments_dentist_starts_at" in explain(connection, stmt)
+
+
+def test_list_routes_filter_through_indexes(db_session):
+    connection = db_session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    # The keyset-paginated list queries: one owner's rows in id order.
+    queries = {
+        "ix_appointments_patient_id_id": select(Appointment).filter(Appointment.patient_id == 1),
+        "ix_billing_patient_id_id": select(Billing).filter(Billing.patient_id == 1),
+        "ix_availability_dentist_id_id": select(Availability).filter(Availability.dentist_id == 1),
+        "ix_feedbacks_dentist_id": select(Feedback).filter(Feedback.dentist_id == 1),
+    }
+    for index, stmt in queries.items():
+        model = stmt.column_descriptions[0]["entity"]
+        plan = explain(connection, stmt.order_by(model.id).limit(100))
+        assert index in plan
+        assert seq_scans(plan, connection.dialect.name) == []
+
+
+def test_migrations_upgrade_a_database_built_by_create_all(db_session):
+    with db_session.get_bind().connect() as connection:
+        assert not schema_is_current(connection)
+        assert upgrade(connection) == LATEST_VERSION
+        assert schema_is_current(connection)
+
+        # Take appointments back to before they carried their interval, with a booking made then.
+        connection.execute(text("DROP INDEX ix_appointments_dentist_starts_at"))
+        connection.execute(text("ALTER TABLE appointments DROP COLUMN starts_at"))
+        connection.execute(text("ALTER TABLE appointments DROP COLUMN ends_at"))
+        connection.execute(schema_version.delete())
+        connection.commit()
+        dentist = Dentist(first_name="Legacy", last_name="Dentist", speciality="general")
+        patient = Patient(first_name="Legacy", last_name="Patient", email="legacy@example.com")
+        db_session.add_all([dentist, patient])
+        db_session.commit()
+        connection.execute(
+            text("INSERT INTO appointments (patient_id, dentist_id, date, time, status, treatment_type) "
+                 "VALUES (:patient_id, :dentist_id, :date, :time, 'pending', 'filling')").bindparams(
+                bindparam("date", type_=Date), bindparam("time", type_=Time)),
+            {"patient_id": patient.id, "dentist_id": dentist.id, "date": datetime.date(2024, 1, 2),
+             "time": datetime.time(9, 0)},
+        )
+        connection.commit()
+
+        assert not schema_is_current(connection)
+        assert upgrade(connection) == LATEST_VERSION
+        assert schema_is_current(connection)
+        indexes = {index["name"] for index in inspect(connection).get_indexes("appointments")}
+        assert {"ix_appointments_dentist_starts_at", "uq_appointments_dentist_slot"} <= indexes
+        assert connection.execute(select(Appointment.starts_at, Appointment.ends_at)).one() == (
+            datetime.datetime(2024, 1, 2, 9, 0), datetime.datetime(2024, 1, 2, 9, 45))
+
+
+def test_migrations_build_the_schema_the_models_describe(db_session):
+    with db_session.get_bind().connect() as connection:
+        Base.metadata.drop_all(connection)
+        connection.commit()
+        assert upgrade(connection) == LATEST_VERSION
+        inspector = inspect(connection)
+        for table in Base.metadata.sorted_tables:
+            assert {info["name"] for info in inspector.get_columns(table.name)} == set(table.columns.keys())
+            assert {info["name"] for info in inspector.get_indexes(table.name)} >= {
+                index.name for index in table.indexes}, table.name
+
+
+def test_conditional_get_and_if_match_on_patient(setup_database):
+    payload = {"first_name": "John", "last_name": "Doe", "email": "john.doe@example.com"}
+    patient_id = client.post("/patient/patients", json=payload).json()["id"]
+
+    response = client.get(f"/patient/patients/{patient_id}")
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+    cached = client.get(f"/patient/patients/{patient_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+    assert client.get(f"/patient/patients/{patient_id}",
+                      headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(f"/patient/patients/{patient_id}", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+    updated = client.put(f"/patient/patients/{patient_id}", json={**payload, "last_name": "Smith"},
+                         headers={"If-Match": etag})
+    assert updated.status_code == 200
+    assert updated.headers["ETag"] != etag
+    # A second writer still holding the first version loses.
+    stale = client.put(f"/patient/patients/{patient_id}", json={**payload, "last_name": "Jones"},
+                       headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert client.get(f"/patient/patients/{patient_id}").json()["last_name"] == "Smith"
+    assert client.get(f"/patient/patients/{patient_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.put("/patient/patients/9999", json=payload, headers={"If-Match": etag}).status_code == 404
+
+
+def test_dentist_cache_is_invalidated_by_writes(setup_database):
+    dentist_id = client.post("/dentist/dentists", json={"first_name": "Jane", "last_name": "Doe"}).json()["id"]
+    before = client.get("/metrics/response-cache").json()
+    etag = client.get(f"/dentist/dentists/{dentist_id}").headers["ETag"]
+    assert client.get(f"/dentist/dentists/{dentist_id}", headers={"If-None-Match": etag}).status_code == 304
+    after = client.get("/metrics/response-cache").json()
+    assert (after["loads"] - before["loads"], after["hits"] - before["hits"]) == (1, 1)
+
+    client.put(f"/dentist/dentists/{dentist_id}", json={"first_name": "Jane", "last_name": "Smith"})
+    assert client.get(f"/dentist/dentists/{dentist_id}").json()["last_name"] == "Smith"
+    client.delete(f"/dentist/dentists/{dentist_id}")
+    assert client.get(f"/dentist/dentists/{dentist_id}").status_code == 404
+
+
+def use_lagging_replica(tmp_path, *rows):
+    """Route get_read_db to a SQLite replica holding copies of just ``rows``, as if it had replayed nothing since."""
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica)
+    with Session(replica) as session:
+        for row in rows:
+            session.merge(row)
+        session.commit()
+    replica_sessions = async_sessionmaker(bind=create_async_engine(make_async_url(replica_url), poolclass=NullPool),
+                                          class_=AsyncSession, expire_on_commit=False)
+
+    async def lagging_replica():
+        async with replica_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = lagging_replica
+
+
+def test_response_cache_fills_from_the_primary(db_session, tmp_path):
+    dentist = Dentist(first_name="Jane", last_name="Doe", license_number="D-1")
+    db_session.add(dentist)
+    db_session.commit()
+    window = Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2030, 1, 7, 9),
+                          end_time=datetime.datetime(2030, 1, 7, 12))
+    db_session.add(window)
+    db_session.commit()
+
+    # The replica has none of the availability, and keeps the dentist's old name.
+    use_lagging_replica(tmp_path, dentist)
+    client.put(f"/dentist/dentists/{dentist.id}",
+               json={"first_name": "Jane", "last_name": "Smith", "license_number": "D-1"})
+    assert client.get(f"/dentist/dentists/{dentist.id}").json()["last_name"] == "Smith"
+    assert len(client.get(f"/availability/{dentist.id}").json()) == 1
+
+
+def test_calendar_index_fills_from_the_primary(db_session, tmp_path, staff_headers):
+    dentist = Dentist(first_name="Jane", last_name="Doe", license_number="D-1")
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    db_session.add_all([dentist, patient])
+    db_session.commit()
+    window = Availability(dentist_id=dentist.id, day_of_week="Monday", start_time=datetime.datetime(2030, 1, 7, 9),
+                          end_time=datetime.datetime(2030, 1, 7, 12))
+    db_session.add(window)
+    db_session.commit()
+
+    # The replica never sees the booking below.
+    use_lagging_replica(tmp_path, dentist, patient, window)
+    slots = {"from": "2030-01-07T09:00", "to": "2030-01-07T12:00", "duration": 60}
+    first = {"treatment_type": "cleaning", "from": "2030-01-07T09:00", "days": 1, "limit": 1}
+    assert len(client.get(f"/availability/{dentist.id}/slots", params=slots).json()) == 3
+    assert client.get("/availability/first-available", params=first).json()[0]["start"] == "2030-01-07T09:00:00"
+
+    booked = client.post("/appointment/dental/appointments", headers=staff_headers, json={
+        "patient_id": patient.id, "dentist_id": dentist.id, "date": "2030-01-07", "time": "09:00",
+        "treatment_type": "cleaning"
+    })
+    assert booked.status_code == 200
+    assert len(client.get(f"/availability/{dentist.id}/slots", params=slots).json()) == 2
+    assert client.get("/availability/first-available", params=first).json()[0]["start"] == "2030-01-07T09:30:00"
+
+def test_response_cache_single_flight_and_ttl():
+    cache = ResponseCache(LocalBackend(100, 60))
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": len(calls)}
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_load("dentist:1", "", load, ttl=0.2) for _ in range(20)))
+        cached = await cache.get_or_load("dentist:1", "", load, ttl=0.2)
+        await asyncio.sleep(0.25)
+        expired = await cache.get_or_load("dentist:1", "", load, ttl=0.2)
+        await cache.invalidate("dentist:1")
+        invalidated = await cache.get_or_load("dentist:1", "", load, ttl=0.2)
+        return first, cached, expired, invalidated
+
+    first, cached, expired, invalidated = asyncio.run(run())
+    assert first == [{"value": 1}] * 20
+    assert cached == {"value": 1}
+    assert expired == {"value": 2}
+    assert invalidated == {"value": 3}
+    assert cache.stats()["coalesced"] == 19
+
+
+def test_response_cache_applies_other_workers_invalidations():
+    cache = ResponseCache(LocalBackend(100, 60))
+    listener = InvalidationListener(cache)
+
+    async def load():
+        return {"value": 1}
+
+    async def run():
+        for dentist_id in (1, 2, 3):
+            await cache.get_or_load(f"dentist:{dentist_id}", "", load, ttl=60)
+        listener._on_notify(None, 0, "response_cache_invalidations", "dentist:1,dentist:3")
+        await asyncio.gather(*listener._pending)
+        return [await cache.backend.get(f"dentist:{dentist_id}:") for dentist_id in (1, 2, 3)]
+
+    assert asyncio.run(run()) == [None, {"value": 1}, None]
+
+    scopes = [f"dentist:{dentist_id}" for dentist_id in range(2000)]
+    payloads = list(notify_payloads(scopes + scopes))
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= NOTIFY_PAYLOAD_LIMIT for payload in payloads)
+    assert ",".join(payloads).split(",") == scopes
+
+
+def test_shared_cache_drops_a_load_that_raced_another_workers_write():
+    shared = MemoryRedis()
+    worker_a, worker_b = ResponseCache(RedisBackend(shared)), ResponseCache(RedisBackend(shared))
+
+    async def run():
+        release = asyncio.Event()
+
+        async def stale_load():
+            await release.wait()
+            return {"last_name": "Doe"}
+
+        async def fresh_load():
+            return {"last_name": "Smith"}
+
+        loading = asyncio.create_task(worker_b.get_or_load("dentist:1", "", stale_load, ttl=60))
+        await asyncio.sleep(0)
+        # Worker A's write lands while worker B's query is still running.
+        await worker_a.invalidate("dentist:1")
+        release.set()
+        stale = await loading
+        fresh = await worker_a.get_or_load("dentist:1", "", fresh_load, ttl=60)
+        shared_hit = await worker_b.get_or_load("dentist:1", "", stale_load, ttl=60)
+        await shared.set("other:app", "1")
+        await worker_a.clear()
+        return stale, fresh, shared_hit, [key async for key in shared.scan_iter()]
+
+    stale, fresh, shared_hit, left = asyncio.run(run())
+    assert (stale, fresh, shared_hit) == ({"last_name": "Doe"}, {"last_name": "Smith"}, {"last_name": "Smith"})
+    assert worker_b.loads == 1
+    # clear only touches the cache's own keys.
+    assert left == ["other:app"]
+
+
+def test_local_backend_forgets_evicted_keys():
+    backend = LocalBackend(maxsize=2, max_ttl=60)
+
+    async def run():
+        for page in range(5):
+            await backend.set(f"availability:{page}", {"page": page}, ttl=60, scope="availability", generation=0)
+        await backend.set("dentist:1:", {"id": 1}, ttl=0.01, scope="dentist:1", generation=0)
+        await asyncio.sleep(0.02)
+        return await backend.get("dentist:1:")
+
+    assert asyncio.run(run()) is None
+    assert backend._scopes == {"availability": {"availability:4"}}
+
+def test_fast_json_list_response_matches_response_model(db_session, monkeypatch, staff_headers):
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    db_session.add_all([patient, dentist])
+    db_session.flush()
+    db_session.add_all([
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, day),
+                    time=datetime.time(9, 30), treatment_type="filling", cost=80.5)
+        for day in range(1, 6)
+    ])
+    db_session.commit()
+    path = f"/appointment/dental/patients/{patient.id}/appointments"
+
+    monkeypatch.setattr(settings, "fast_json_responses", False)
+    validated = client.get(path, headers=staff_headers, params={"limit": 3})
+    monkeypatch.setattr(settings, "fast_json_responses", True)
+    fast = client.get(path, headers=staff_headers, params={"limit": 3})
+    assert fast.status_code == 200
+    assert fast.json() == validated.json()
+    assert fast.headers["X-Next-Cursor"] == validated.headers["X-Next-Cursor"]
+
+
+def test_sparse_fieldsets_trim_the_select(db_session, staff_headers):
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com", address="1 Main St",
+                      medical_history="Allergic to penicillin")
+    dentist = Dentist(first_name="Jane", last_name="Doe")
+    db_session.add_all([patient, dentist])
+    db_session.flush()
+    db_session.add_all([
+        Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, day),
+                    time=datetime.time(9, 30), treatment_type="filling", notes="Upper left molar")
+        for day in range(1, 4)
+    ])
+    db_session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"/patient/patients/{patient.id}", params={"fields": "first_name,email"})
+        page = client.get(f"/appointment/dental/patients/{patient.id}/appointments", headers=staff_headers,
+                          params={"fields": "id,status", "limit": 2})
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    assert response.json() == {"first_name": "John", "email": "john.doe@example.com"}
+    assert response.headers["ETag"].startswith('W/"')
+    assert page.json() == [{"id": 1, "status": "pending"}, {"id": 2, "status": "pending"}]
+    assert "X-Next-Cursor" in page.headers
+    selects = [statement for statement in statements if "FROM patients" in statement
+               or "FROM appointments" in statement]
+    assert selects
+    assert not [statement for statement in selects if "medical_history" in statement or "notes" in statement]
+
+    assert client.get(f"/patient/patients/{patient.id}").json()["medical_history"] == "Allergic to penicillin"
+    assert client.get(f"/patient/patients/{patient.id}", params={"fields": "first_name,ssn"}).status_code == 400
+
+
+def test_include_embeds_related_collections_in_fixed_queries(db_session):
+    patient = Patient(first_name="John", last_name="Doe", email="john.doe@example.com")
+    dentist = Dentist(first_name="Jane", last_name="Doe", license_number="D-1")
+    db_session.add_all([patient, dentist])
+    db_session.flush()
+
+    def add_visits(days):
+        for day in days:
+            appointment = Appointment(patient_id=patient.id, dentist_id=dentist.id, date=datetime.date(2024, 1, day),
+                                      time=datetime.time(9, 0), treatment_type="cleaning")
+            db_session.add(appointment)
+            db_session.flush()
+            db_session.add_all([
+                Billing(appointment_id=appointment.id, patient_id=patient.id, amount_due=50.0, payment_status="paid",
+                        payment_method="card"),
+                Report(patient_id=patient.id, dentist_id=dentist.id, appointment_id=appointment.id,
+                       report_details="No findings"),
+            ])
+        db_session.commit()
+
+    def count_selects(path, params):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", record)
+        try:
+            response = client.get(path, params=params)
+        finally:
+            event.remove(Engine, "before_cursor_execute", record)
+        assert response.status_code == 200
+        return response.json(), len([statement for statement in statements if statement.lstrip().startswith("SELECT")])
+
+    add_visits([1, 2])
+    db_session.add(Insurance(provider=InsuranceProvider.provider_a, policy_number="P-1", patient_id=patient.id))
+    db_session.commit()
+    chart = {"include": "appointments,billing,insurance,reports"}
+    body, queries = count_selects(f"/patient/patients/{patient.id}", chart)
+    assert body["first_name"] == "John"
+    assert [len(body[name]) for name in ("appointments", "billing", "insurance", "reports")] == [2, 2, 1, 2]
+    assert body["insurance"][0]["policy_number"] == "P-1"
+    # The patient plus one query per collection.
+    assert queries == 5
+
+    add_visits(range(3, 13))
+    body, queries = count_selects(f"/patient/patients/{patient.id}", chart)
+    assert len(body["appointments"]) == 12
+    assert queries == 5
+    body, queries = count_selects(f"/dentist/dentists/{dentist.id}", {"include": "appointments,reports"})
+    assert [len(body["appointments"]), len(body["reports"])] == [12, 12]
+    assert queries == 3
+
+    plain = client.get(f"/patient/patients/{patient.id}")
+    assert "appointments" not in plain.json()
+    assert "ETag" in plain.headers
+    assert client.get(f"/patient/patients/{patient.id}", params={"include": "feedback"}).status_code == 400